@@ -0,0 +1,164 @@
+import asyncio
+import io
+import random
+import time
+import wave
+from typing import Dict, Optional
+
+from aiohttp import web
+
+
+def make_wav(seconds: float, sample_rate: int = 16000) -> bytes:
+    # A quiet sawtooth is enough for the preprocessing stage to decode and split
+    frames = bytearray()
+    for i in range(int(seconds * sample_rate)):
+        value = ((i * 220 // sample_rate) % 2) * 2000 - 1000
+        frames.extend(int(value).to_bytes(2, "little", signed=True))
+
+    output = io.BytesIO()
+    with wave.open(output, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(bytes(frames))
+    return output.getvalue()
+
+
+class MockElevenLabs:
+    def __init__(self, latency: float = 0.2, payload_size: int = 64 * 1024,
+                 error_rate: float = 0.0, voices: int = 50):
+        self.latency = latency
+        self.payload_size = payload_size
+        self.error_rate = error_rate
+        self.voices = voices
+        self.requests = 0
+        self._payload = b"\xff\xfb\x90\x00" + b"\x00" * (payload_size - 4)
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=100 * 1024 * 1024)
+        app.router.add_get("/voices", self.get_voices)
+        app.router.add_post("/text-to-speech/{voice_id}", self.audio)
+        app.router.add_post("/text-to-speech/{voice_id}/stream", self.stream_audio)
+        app.router.add_post("/speech-to-speech/{voice_id}", self.audio)
+        app.router.add_post("/voices/add", self.add_voice)
+        return app
+
+    async def _simulate(self) -> Optional[web.Response]:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        if random.random() < self.error_rate:
+            return web.Response(status=503, text="mock overload")
+        return None
+
+    async def get_voices(self, request: web.Request) -> web.Response:
+        error = await self._simulate()
+        if error:
+            return error
+        languages = ["en", "ru", "de", "fr", "es"]
+        return web.json_response({"voices": [
+            {
+                "voice_id": f"voice{i:04d}",
+                "name": f"Voice {i}",
+                "category": "professional",
+                "labels": {"language": languages[i % len(languages)], "gender": "male" if i % 2 else "female"}
+            }
+            for i in range(self.voices)
+        ]})
+
+    async def audio(self, request: web.Request) -> web.Response:
+        await request.read()
+        error = await self._simulate()
+        return error or web.Response(body=self._payload, content_type="audio/mpeg")
+
+    async def stream_audio(self, request: web.Request) -> web.StreamResponse:
+        await request.read()
+        error = await self._simulate()
+        if error:
+            return error
+
+        response = web.StreamResponse(headers={"Content-Type": "audio/mpeg"})
+        await response.prepare(request)
+        for offset in range(0, len(self._payload), 16 * 1024):
+            await response.write(self._payload[offset:offset + 16 * 1024])
+        await response.write_eof()
+        return response
+
+    async def add_voice(self, request: web.Request) -> web.Response:
+        await request.read()
+        error = await self._simulate()
+        return error or web.json_response({"voice_id": f"cloned{self.requests}"})
+
+
+class MockTelegram:
+    def __init__(self, latency: float = 0.02, voice_seconds: float = 10):
+        self.latency = latency
+        self.voice_file = make_wav(voice_seconds)
+        self.calls = 0
+        self.error_replies = 0
+        self._message_id = 0
+        self._reply_waiters: Dict[int, asyncio.Future] = {}
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=100 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self.call)
+        app.router.add_get("/file/bot{token}/{path:.+}", self.download)
+        return app
+
+    def expect_reply(self, chat_id: int) -> asyncio.Future:
+        # Resolved by the next final reply to the chat: an audio file or a ✅/❌ message
+        future = asyncio.get_running_loop().create_future()
+        self._reply_waiters[chat_id] = future
+        return future
+
+    def _resolve_reply(self, chat_id, method: str, text: str):
+        if method != "sendaudio" and not text.startswith(("✅", "❌")):
+            return
+        future = self._reply_waiters.pop(int(chat_id), None)
+        if future and not future.done():
+            future.set_result(text.startswith("❌"))
+
+    def _message(self, chat_id) -> dict:
+        self._message_id += 1
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"}
+        }
+
+    async def call(self, request: web.Request) -> web.Response:
+        self.calls += 1
+        method = request.match_info["method"].lower()
+        form = await request.post()
+        await asyncio.sleep(self.latency)
+
+        text = str(form.get("text", ""))
+        if text.startswith("❌"):
+            self.error_replies += 1
+        if method in ("sendmessage", "sendaudio"):
+            self._resolve_reply(form.get("chat_id", 0), method, text)
+
+        if method in ("sendmessage", "editmessagetext"):
+            result = self._message(form.get("chat_id", 0))
+        elif method == "sendaudio":
+            result = self._message(form.get("chat_id", 0))
+            result["audio"] = {
+                "file_id": f"audio{self._message_id}",
+                "file_unique_id": f"audio_unique{self._message_id}",
+                "duration": 1
+            }
+        elif method == "getfile":
+            result = {"file_id": form["file_id"], "file_unique_id": form["file_id"], "file_path": "voice/input.wav"}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def download(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.latency)
+        return web.Response(body=self.voice_file)
+
+
+async def start_app(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
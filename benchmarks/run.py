@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from itertools import count
+from typing import Dict, List
+
+ELEVENLABS_PORT = 18081
+TELEGRAM_PORT = 18082
+BOT_TOKEN = "123456:benchmark-token"
+
+
+def configure_environment(workdir: str):
+    # config.py reads the environment on import, so this has to run before handlers are imported
+    os.environ["BOT_TOKEN"] = BOT_TOKEN
+    os.environ["ELEVENLABS_API_KEY"] = "benchmark"
+    os.environ["TTS_CACHE_DIR"] = os.path.join(workdir, "tts")
+    os.environ["UPLOADS_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["RATE_LIMIT_PER_SECOND"] = "1000000"
+    os.environ["RATE_LIMIT_BURST"] = "1000000"
+    os.environ["DAILY_CHARACTER_QUOTA"] = str(10 ** 12)
+    os.environ["DAILY_AUDIO_SECONDS_QUOTA"] = str(10 ** 12)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def message_update(update_id: int, user_id: int, **content) -> Dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            **content
+        }
+    }
+
+
+async def run_scenario(bot, dp, telegram, name: str, requests: int, concurrency: int, users: int,
+                       text_length: int, reply_timeout: float) -> Dict:
+    from aiogram.types import Update
+
+    from handlers import voice
+
+    update_ids = count(int(time.time() * 1000))
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    # FSM state is per user, so one user's requests must not interleave
+    user_locks = defaultdict(asyncio.Lock)
+
+    async def one(i: int):
+        nonlocal errors
+        user_id = 1000 + i % users
+        update_id = next(update_ids)
+
+        if name == "tts":
+            text = f"Benchmark request {update_id}. " + "x" * max(0, text_length - 30)
+            update = message_update(update_id, user_id, text=text)
+        elif name == "sts":
+            # Sent as an audio file so the WAV sample is probed rather than decoded as OGG/Opus
+            update = message_update(update_id, user_id, audio={
+                "file_id": f"voice{update_id}",
+                "file_unique_id": f"voice_unique{update_id}_{time.time_ns()}",
+                "duration": 10,
+                "mime_type": "audio/wav"
+            })
+        else:
+            update = message_update(update_id, user_id, text="/sync_voices", entities=[
+                {"type": "bot_command", "offset": 0, "length": len("/sync_voices")}
+            ])
+
+        async with user_locks[user_id], semaphore:
+            if name == "tts":
+                context = dp.fsm.get_context(bot, chat_id=user_id, user_id=user_id)
+                await context.set_state(voice.VoiceStates.waiting_for_text)
+                await context.update_data(voice_id="voice0001")
+
+            # Latency runs until the final reply: voice messages are converted by background jobs
+            reply = telegram.expect_reply(user_id)
+            started = time.perf_counter()
+            try:
+                await dp.feed_update(bot, Update.model_validate(update, context={"bot": bot}))
+                await asyncio.wait_for(reply, reply_timeout)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "scenario": name,
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(requests / elapsed, 2) if elapsed else 0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1)
+    }
+
+
+async def main(args: argparse.Namespace):
+    from aiogram import Bot, Dispatcher
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.fsm.storage.memory import MemoryStorage
+
+    from benchmarks.mock_servers import MockElevenLabs, MockTelegram, start_app
+    from handlers import voice
+
+    elevenlabs = MockElevenLabs(
+        latency=args.api_latency,
+        payload_size=args.payload_size,
+        error_rate=args.error_rate
+    )
+    telegram = MockTelegram(latency=args.telegram_latency)
+    runners = [
+        await start_app(elevenlabs.app(), ELEVENLABS_PORT),
+        await start_app(telegram.app(), TELEGRAM_PORT)
+    ]
+
+    voice.elevenlabs_api.api_url = f"http://127.0.0.1:{ELEVENLABS_PORT}"
+    await voice.db.create_pool()
+    await voice.db.create_tables()
+    await voice.voice_catalog.load()
+    await voice.elevenlabs_api.start()
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{TELEGRAM_PORT}"))
+    bot = Bot(token=BOT_TOKEN, session=session)
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.include_router(voice.router)
+    voice.job_queue.start(bot)
+
+    results = []
+    try:
+        for scenario in args.scenarios:
+            tracemalloc.start()
+            error_replies = telegram.error_replies
+            result = await run_scenario(
+                bot, dp, telegram, scenario,
+                args.requests, args.concurrency, args.users, args.text_length, args.reply_timeout
+            )
+            # Handlers report most failures to the user instead of raising
+            result["errors"] += telegram.error_replies - error_replies
+            result["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+            tracemalloc.stop()
+            result["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2)
+            results.append(result)
+    finally:
+        await voice.job_queue.close()
+        await bot.session.close()
+        await voice.elevenlabs_api.close()
+        voice.audio_processor.close()
+        await voice.db.close()
+        for runner in runners:
+            await runner.cleanup()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        columns = ["scenario", "requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "peak_traced_mb", "max_rss_mb"]
+        print("  ".join(f"{column:>14}" for column in columns))
+        for result in results:
+            print("  ".join(f"{str(result[column]):>14}" for column in columns))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline throughput benchmark against mock ElevenLabs and Telegram servers")
+    parser.add_argument("scenarios", nargs="*", default=["tts", "sts", "sync"], choices=["tts", "sts", "sync"])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--text-length", type=int, default=200)
+    parser.add_argument("--api-latency", type=float, default=0.2, help="Mock ElevenLabs latency, seconds")
+    parser.add_argument("--telegram-latency", type=float, default=0.02, help="Mock Telegram latency, seconds")
+    parser.add_argument("--payload-size", type=int, default=64 * 1024, help="Mock audio size, bytes")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of mock ElevenLabs 503 responses")
+    parser.add_argument("--reply-timeout", type=float, default=120, help="Seconds to wait for each final reply")
+    parser.add_argument("--json", action="store_true")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(workdir)
+
+        from config import DATABASE_URL
+        if not DATABASE_URL:
+            sys.exit("Set DATABASE_URL to a scratch MySQL database (the handlers rely on MySQL upserts)")
+
+        asyncio.run(main(arguments))
@@ -1,34 +1,140 @@
 import asyncio
 import logging
 
+from aiohttp import web
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
-from handlers.voice import router, db
-from config import BOT_TOKEN
+from handlers.voice import router, db, elevenlabs_api, voice_catalog, blob_store, audio_processor, job_queue, fetch_voices
+from services.fsm_storage import create_fsm_storage, create_events_isolation
+from services.metrics import registry, TraceIdFilter
+from middlewares.tracing import TracingMiddleware
+from config import (
+    BOT_TOKEN,
+    BOT_MODE,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBAPP_HOST,
+    WEBAPP_PORT,
+    FSM_STORAGE,
+    FSM_STORAGE_URL,
+    FSM_STATE_TTL,
+    METRICS_PORT,
+    JOB_WORKERS,
+    VOICE_SYNC_INTERVAL
+)
+
+
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+async def metrics(request: web.Request) -> web.Response:
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server() -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/health", health)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=WEBAPP_HOST, port=METRICS_PORT).start()
+    logging.info(f"Metrics server listening on {WEBAPP_HOST}:{METRICS_PORT}")
+    return runner
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    if not WEBHOOK_URL or not WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_URL and WEBHOOK_SECRET must be set in webhook mode")
+
+    # Every replica registers the same URL, so repeated calls are harmless
+    await bot.set_webhook(
+        f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types()
+    )
+
+    app = web.Application()
+    app.router.add_get("/health", health)
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    # Metrics stay on their own port so they are not exposed alongside the public webhook
+    metrics_runner = await start_metrics_server() if METRICS_PORT else None
+    try:
+        await web.TCPSite(runner, host=WEBAPP_HOST, port=WEBAPP_PORT).start()
+        logging.info(f"Webhook server listening on {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}")
+        await asyncio.Event().wait()
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await runner.cleanup()
 
 
 async def main():
 
     logging.basicConfig(
         level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        format='%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s'
     )
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(TraceIdFilter())
 
-    storage = MemoryStorage()
+    storage = create_fsm_storage(FSM_STORAGE, FSM_STORAGE_URL, FSM_STATE_TTL)
     bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher(storage=storage)
+    events_isolation = create_events_isolation(FSM_STORAGE, FSM_STORAGE_URL)
+    dp = Dispatcher(storage=storage, events_isolation=events_isolation)
 
     await db.create_pool()
     await db.create_tables()
+    await voice_catalog.load()
+    await elevenlabs_api.start()
 
 
+    dp.update.outer_middleware(TracingMiddleware())
     dp.include_router(router)
+    cleanup_task = asyncio.create_task(blob_store.run_cleanup())
+    # JOB_WORKERS=0 leaves conversions to separate `python worker.py` processes
+    if JOB_WORKERS:
+        job_queue.start(bot)
+    sync_task = asyncio.create_task(
+        voice_catalog.run_periodic_sync(fetch_voices, VOICE_SYNC_INTERVAL)
+    ) if VOICE_SYNC_INTERVAL else None
 
     try:
-        await dp.start_polling(bot)
+        if BOT_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            metrics_runner = await start_metrics_server() if METRICS_PORT else None
+            try:
+                await dp.start_polling(bot)
+            finally:
+                if metrics_runner:
+                    await metrics_runner.cleanup()
     finally:
+        cleanup_task.cancel()
+        if sync_task:
+            sync_task.cancel()
+        await job_queue.close()
         await bot.session.close()
+        await storage.close()
+        await events_isolation.close()
+        await elevenlabs_api.close()
+        audio_processor.close()
+        logging.info(
+            "ElevenLabs connections: %d new, %d reused",
+            elevenlabs_api.stats["new_connections"],
+            elevenlabs_api.stats["reused_connections"]
+        )
         await db.close()
 
 
@@ -9,3 +9,64 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 API_URL = "https://api.elevenlabs.io/v1"
 DATABASE_URL = os.getenv("DATABASE_URL")
+
+ELEVENLABS_CONNECTION_LIMIT = int(os.getenv("ELEVENLABS_CONNECTION_LIMIT", 20))
+ELEVENLABS_KEEPALIVE_TIMEOUT = float(os.getenv("ELEVENLABS_KEEPALIVE_TIMEOUT", 60))
+ELEVENLABS_DNS_CACHE_TTL = int(os.getenv("ELEVENLABS_DNS_CACHE_TTL", 300))
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "cache/tts")
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+TTS_CACHE_DISK_BYTES = int(os.getenv("TTS_CACHE_DISK_BYTES", 1024 * 1024 * 1024))
+
+TTS_MAX_CHUNK_CHARS = int(os.getenv("TTS_MAX_CHUNK_CHARS", 1000))
+TTS_CHUNK_CONCURRENCY = int(os.getenv("TTS_CHUNK_CONCURRENCY", 3))
+TTS_SEND_FIRST_CHUNK = os.getenv("TTS_SEND_FIRST_CHUNK", "true").lower() == "true"
+
+ELEVENLABS_MAX_IN_FLIGHT = int(os.getenv("ELEVENLABS_MAX_IN_FLIGHT", 4))
+ELEVENLABS_MAX_PER_USER = int(os.getenv("ELEVENLABS_MAX_PER_USER", 2))
+
+ELEVENLABS_MAX_RETRIES = int(os.getenv("ELEVENLABS_MAX_RETRIES", 3))
+ELEVENLABS_REQUEST_DEADLINE = float(os.getenv("ELEVENLABS_REQUEST_DEADLINE", 120))
+ELEVENLABS_BREAKER_THRESHOLD = int(os.getenv("ELEVENLABS_BREAKER_THRESHOLD", 5))
+ELEVENLABS_BREAKER_RESET = float(os.getenv("ELEVENLABS_BREAKER_RESET", 30))
+
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", 8080))
+
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory")
+FSM_STORAGE_URL = os.getenv("FSM_STORAGE_URL")
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", 3600))
+
+UPLOADS_DIR = os.getenv("UPLOADS_DIR", "cache/uploads")
+UPLOADS_MAX_TOTAL_BYTES = int(os.getenv("UPLOADS_MAX_TOTAL_BYTES", 2 * 1024 * 1024 * 1024))
+UPLOADS_MAX_USER_BYTES = int(os.getenv("UPLOADS_MAX_USER_BYTES", 200 * 1024 * 1024))
+UPLOADS_TTL = int(os.getenv("UPLOADS_TTL", 3600))
+
+CLONE_MAX_SAMPLES = int(os.getenv("CLONE_MAX_SAMPLES", 25))
+CLONE_MIN_DURATION = int(os.getenv("CLONE_MIN_DURATION", 30))
+
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", 2))
+AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", 24000))
+AUDIO_BITRATE = os.getenv("AUDIO_BITRATE", "64k")
+AUDIO_SILENCE_THRESHOLD = float(os.getenv("AUDIO_SILENCE_THRESHOLD", -50.0))
+
+STS_SEGMENT_SECONDS = float(os.getenv("STS_SEGMENT_SECONDS", 60))
+STS_CONCURRENCY = int(os.getenv("STS_CONCURRENCY", 3))
+
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", 0.2))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", 3))
+DAILY_CHARACTER_QUOTA = int(os.getenv("DAILY_CHARACTER_QUOTA", 10000))
+DAILY_AUDIO_SECONDS_QUOTA = int(os.getenv("DAILY_AUDIO_SECONDS_QUOTA", 600))
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9100))
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 2))
+JOB_LEASE = float(os.getenv("JOB_LEASE", 60))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+
+VOICE_SYNC_INTERVAL = float(os.getenv("VOICE_SYNC_INTERVAL", 3600))
@@ -1,24 +1,49 @@
-from typing import List, Dict
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Dict, Optional
+import hashlib
+import json
 import logging
+import time
 
 
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy import Column, Integer, String, Boolean, select, delete
+from sqlalchemy import Column, Integer, BigInteger, Float, String, Boolean, Date, DateTime, Text, Index, UniqueConstraint, select, update, delete, func
+from sqlalchemy import event, inspect, text
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.dialects.mysql import insert
 
+from services.metrics import DB_QUERY_SECONDS
+from services.elevenlabs import LANGUAGE_MAPPING
+
 Base = declarative_base()
 
+VOICE_CONTENT_FIELDS = ('name', 'language', 'gender', 'is_cloned')
+
+
+def voice_content_hash(voice: Dict) -> str:
+    content = json.dumps([voice.get(field) for field in VOICE_CONTENT_FIELDS], ensure_ascii=False)
+    return hashlib.sha256(content.encode()).hexdigest()
+
 
 class Voice(Base):
     __tablename__ = 'voices'
+    __table_args__ = (
+        Index('ix_voices_language_gender_cloned', 'language', 'gender', 'is_cloned'),
+        Index('ix_voices_language_owner', 'language', 'owner_user_id'),
+        Index('ix_voices_owner', 'owner_user_id'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     voice_id = Column(String(255), unique=True, nullable=False)
     name = Column(String(100), nullable=False)
+    # ISO code (or 'unknown'/'custom'); display names come from LANGUAGE_MAPPING
     language = Column(String(50), nullable=False)
     gender = Column(String(20))
     is_cloned = Column(Boolean, default=False)
+    # NULL for shared library voices, the Telegram user id for voices cloned through the bot
+    owner_user_id = Column(BigInteger)
+    content_hash = Column(String(64))
 
     def to_dict(self):
         return {
@@ -27,10 +52,70 @@ class Voice(Base):
             'name': self.name,
             'language': self.language,
             'gender': self.gender,
-            'is_cloned': self.is_cloned
+            'is_cloned': self.is_cloned,
+            'owner_user_id': self.owner_user_id
         }
 
 
+class CatalogVersion(Base):
+    __tablename__ = 'catalog_version'
+
+    # Single row bumped on every voice write so other processes know to reload their catalog
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+class AudioFile(Base):
+    __tablename__ = 'audio_files'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    cache_key = Column(String(100), unique=True, nullable=False)
+    file_id = Column(String(255), nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+
+class UserUsage(Base):
+    __tablename__ = 'user_usage'
+    __table_args__ = (UniqueConstraint('user_id', 'day'),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, nullable=False)
+    day = Column(Date, nullable=False)
+    characters = Column(Integer, nullable=False, default=0)
+    audio_seconds = Column(Float, nullable=False, default=0)
+
+
+class Job(Base):
+    __tablename__ = 'jobs'
+    __table_args__ = (Index('ix_jobs_status_available_at', 'status', 'available_at'),)
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    kind = Column(String(20), nullable=False)
+    user_id = Column(BigInteger, nullable=False)
+    chat_id = Column(BigInteger, nullable=False)
+    payload = Column(Text, nullable=False)
+    # pending: runnable once available_at passes; running: available_at is the lease expiry
+    status = Column(String(20), nullable=False, default='pending')
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, nullable=False)
+    error = Column(Text)
+    created_at = Column(DateTime, server_default=func.now())
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'user_id': self.user_id,
+            'chat_id': self.chat_id,
+            'payload': json.loads(self.payload),
+            'attempts': self.attempts
+        }
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class Database:
     def __init__(self, database_url: str):
         self.database_url = database_url
@@ -48,6 +133,9 @@ class Database:
                 max_overflow=10
             )
 
+            event.listen(self.engine.sync_engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(self.engine.sync_engine, "after_cursor_execute", self._after_cursor_execute)
+
             self.async_session = sessionmaker(
                 self.engine,
                 class_=AsyncSession,
@@ -62,12 +150,16 @@ class Database:
             logging.error(f"Failed to connect to database: {e}")
             raise
 
-    async def get_voices_by_language(self, language: str) -> List[Dict]:
-        async with self.async_session() as session:
-            query = select(Voice).where(Voice.language == language)
-            result = await session.execute(query)
-            voices = result.scalars().all()
-            return [voice.to_dict() for voice in voices]
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Kept on the execution context, so a statement that raises leaves nothing behind on the connection
+        context._query_started = time.perf_counter()
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = context._query_started
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, operation=operation)
 
     async def get_all_voices(self) -> List[Dict]:
 
@@ -77,30 +169,185 @@ class Database:
             voices = result.scalars().all()
             return [voice.to_dict() for voice in voices]
 
+    @staticmethod
+    def _upsert_voices_statement(voices: List[Dict]):
+        stmt = insert(Voice).values([
+            {
+                'voice_id': voice['voice_id'],
+                'name': voice['name'],
+                'language': voice['language'],
+                'gender': voice.get('gender'),
+                'is_cloned': voice.get('is_cloned', False),
+                'owner_user_id': voice.get('owner_user_id'),
+                'content_hash': voice_content_hash(voice)
+            }
+            for voice in voices
+        ])
+        # A sync never takes a cloned voice away from its owner, but add_voice still claims
+        # a clone that a sync inserted first (without an owner) between cloning and saving
+        return stmt.on_duplicate_key_update(
+            name=stmt.inserted.name,
+            language=stmt.inserted.language,
+            gender=stmt.inserted.gender,
+            is_cloned=stmt.inserted.is_cloned,
+            owner_user_id=func.coalesce(Voice.owner_user_id, stmt.inserted.owner_user_id),
+            content_hash=stmt.inserted.content_hash
+        )
+
+    @staticmethod
+    def _bump_catalog_version_statement():
+        stmt = insert(CatalogVersion).values(id=1, version=1)
+        return stmt.on_duplicate_key_update(version=CatalogVersion.version + 1)
+
+    async def get_catalog_version(self) -> int:
+        async with self.async_session() as session:
+            result = await session.execute(select(CatalogVersion.version).where(CatalogVersion.id == 1))
+            return result.scalar_one_or_none() or 0
+
     async def add_voice(self, voice_data: Dict):
         async with self.async_session() as session:
-            stmt = insert(Voice).values(
-                voice_id=voice_data['voice_id'],
-                name=voice_data['name'],
-                language=voice_data['language'],
-                gender=voice_data.get('gender'),
-                is_cloned=voice_data.get('is_cloned', False)
+            async with session.begin():
+                await session.execute(self._upsert_voices_statement([voice_data]))
+                await session.execute(self._bump_catalog_version_statement())
+
+    async def get_voice(self, voice_id: str) -> Optional[Dict]:
+        async with self.async_session() as session:
+            result = await session.execute(select(Voice).where(Voice.voice_id == voice_id))
+            voice = result.scalar_one_or_none()
+            return voice.to_dict() if voice else None
+
+    async def get_voice_hashes(self) -> Dict[str, Dict]:
+        async with self.async_session() as session:
+            result = await session.execute(select(Voice.voice_id, Voice.content_hash, Voice.owner_user_id))
+            return {
+                voice_id: {'content_hash': content_hash, 'owner_user_id': owner_user_id}
+                for voice_id, content_hash, owner_user_id in result.all()
+            }
+
+    async def apply_voice_changes(self, upserts: List[Dict], removed_voice_ids: List[str]):
+        async with self.async_session() as session:
+            async with session.begin():
+                if upserts:
+                    await session.execute(self._upsert_voices_statement(upserts))
+                if removed_voice_ids:
+                    await session.execute(delete(Voice).where(
+                        Voice.voice_id.in_(removed_voice_ids),
+                        Voice.owner_user_id.is_(None)
+                    ))
+                await session.execute(self._bump_catalog_version_statement())
+
+    async def get_audio_file_id(self, cache_key: str) -> Optional[str]:
+        async with self.async_session() as session:
+            query = select(AudioFile.file_id).where(AudioFile.cache_key == cache_key)
+            result = await session.execute(query)
+            return result.scalar_one_or_none()
+
+    async def save_audio_file_id(self, cache_key: str, file_id: str):
+        async with self.async_session() as session:
+            stmt = insert(AudioFile).values(cache_key=cache_key, file_id=file_id)
+            stmt = stmt.on_duplicate_key_update(file_id=stmt.inserted.file_id)
+            await session.execute(stmt)
+            await session.commit()
+
+    async def delete_audio_file_id(self, cache_key: str):
+        async with self.async_session() as session:
+            await session.execute(delete(AudioFile).where(AudioFile.cache_key == cache_key))
+            await session.commit()
+
+    async def get_usage(self, user_id: int, day: date) -> Dict:
+        async with self.async_session() as session:
+            query = select(UserUsage).where(UserUsage.user_id == user_id, UserUsage.day == day)
+            result = await session.execute(query)
+            usage = result.scalar_one_or_none()
+            if usage is None:
+                return {'characters': 0, 'audio_seconds': 0.0}
+            return {'characters': usage.characters, 'audio_seconds': usage.audio_seconds}
+
+    async def try_add_usage(self, user_id: int, day: date, characters: int, audio_seconds: float,
+                            max_characters: int, max_audio_seconds: float) -> bool:
+        async with self.async_session() as session:
+            async with session.begin():
+                row = insert(UserUsage).values(user_id=user_id, day=day, characters=0, audio_seconds=0)
+                await session.execute(row.on_duplicate_key_update(user_id=row.inserted.user_id))
+
+                # The limit is checked in the UPDATE itself, so concurrent requests can't overshoot it
+                result = await session.execute(
+                    update(UserUsage)
+                    .where(
+                        UserUsage.user_id == user_id,
+                        UserUsage.day == day,
+                        UserUsage.characters + characters <= max_characters,
+                        UserUsage.audio_seconds + audio_seconds <= max_audio_seconds
+                    )
+                    .values(
+                        characters=UserUsage.characters + characters,
+                        audio_seconds=UserUsage.audio_seconds + audio_seconds
+                    )
+                )
+                return result.rowcount == 1
+
+    async def enqueue_job(self, kind: str, user_id: int, chat_id: int, payload: Dict) -> int:
+        async with self.async_session() as session:
+            job = Job(
+                kind=kind,
+                user_id=user_id,
+                chat_id=chat_id,
+                payload=json.dumps(payload),
+                status='pending',
+                attempts=0,
+                available_at=_utcnow()
             )
+            session.add(job)
+            await session.commit()
+            return job.id
 
+    async def claim_job(self, lease: float) -> Optional[Dict]:
+        async with self.async_session() as session:
+            async with session.begin():
+                now = _utcnow()
+                # Running jobs whose lease expired belong to a dead worker and are picked up again
+                query = (
+                    select(Job)
+                    .where(Job.status.in_(('pending', 'running')), Job.available_at <= now)
+                    .order_by(Job.id)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                )
+                job = (await session.execute(query)).scalar_one_or_none()
+                if job is None:
+                    return None
+
+                job.status = 'running'
+                job.attempts += 1
+                job.available_at = now + timedelta(seconds=lease)
+                return job.to_dict()
 
-            stmt = stmt.on_duplicate_key_update(
-                name=stmt.inserted.name,
-                language=stmt.inserted.language,
-                gender=stmt.inserted.gender,
-                is_cloned=stmt.inserted.is_cloned
+    async def extend_job_lease(self, job_id: int, lease: float):
+        async with self.async_session() as session:
+            await session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == 'running')
+                .values(available_at=_utcnow() + timedelta(seconds=lease))
             )
+            await session.commit()
 
-            await session.execute(stmt)
+    async def complete_job(self, job_id: int):
+        async with self.async_session() as session:
+            await session.execute(delete(Job).where(Job.id == job_id))
             await session.commit()
 
-    async def clear_voices(self):
+    async def retry_job(self, job_id: int, delay: float, error: str):
         async with self.async_session() as session:
-            await session.execute(delete(Voice))
+            await session.execute(
+                update(Job)
+                .where(Job.id == job_id)
+                .values(status='pending', available_at=_utcnow() + timedelta(seconds=delay), error=error)
+            )
+            await session.commit()
+
+    async def fail_job(self, job_id: int, error: str):
+        async with self.async_session() as session:
+            await session.execute(update(Job).where(Job.id == job_id).values(status='failed', error=error))
             await session.commit()
 
     async def close(self):
@@ -108,10 +355,51 @@ class Database:
         if self.engine:
             await self.engine.dispose()
 
+    @staticmethod
+    def _add_missing_columns(conn):
+        # create_all skips existing tables, so columns added to the models later are created here
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    definition = CreateColumn(column).compile(dialect=conn.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {definition}"))
+                    logging.info(f"Added column {table.name}.{column.name}")
+
+    @staticmethod
+    def _add_missing_indexes(conn):
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(conn)
+                    logging.info(f"Created index {index.name}")
+
+    @staticmethod
+    def _migrate_language_codes(conn):
+        # Older versions stored the Russian display name instead of the language code
+        codes = {name: code for code, name in LANGUAGE_MAPPING.items()}
+        stored = conn.execute(select(Voice.language).distinct()).scalars().all()
+        for name in stored:
+            if name in codes:
+                conn.execute(
+                    update(Voice)
+                    .where(Voice.language == name)
+                    .values(language=codes[name], content_hash=None)
+                )
+                logging.info(f"Migrated voice language {name} -> {codes[name]}")
+
     async def create_tables(self):
         try:
             async with self.engine.begin() as conn:
                 await conn.run_sync(Base.metadata.create_all)
+                await conn.run_sync(self._add_missing_columns)
+                await conn.run_sync(self._add_missing_indexes)
+                await conn.run_sync(self._migrate_language_codes)
             logging.info("Tables created successfully.")
         except Exception as e:
             logging.error(f"Failed to create tables: {e}")
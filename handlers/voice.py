@@ -1,24 +1,152 @@
+import asyncio
+import logging
 import os
+import time
+from typing import Dict, List, Optional, Callable, Awaitable
 
-from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram import Bot, Router, F
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.filters import Command
-
-from services.elevenlabs import ElevenLabsAPI
+from aiogram.exceptions import TelegramBadRequest
+
+from services.elevenlabs import ElevenLabsAPI, TTS_MODEL_ID, TTS_VOICE_SETTINGS, language_name
+from services.resilience import CircuitBreaker
+from services.cache import AudioCache
+from services.catalog import VoiceCatalog
+from services.streaming import StreamInputFile
+from services.blobs import BlobStore, BlobMissingError
+from services.singleflight import SingleFlight
+from services.jobs import JobQueue
+from services.scheduler import (
+    RequestScheduler,
+    PRIORITY_TTS,
+    PRIORITY_LONG_TTS,
+    PRIORITY_STS,
+    PRIORITY_BACKGROUND
+)
+from services.text import split_text
+from services.audio import concat_mp3, AudioProcessor
 from database.database import Database
+from middlewares.rate_limit import RateLimitMiddleware
+from services.metrics import registry, span, AUDIO_BYTES
 from keyboards.keyboards import (
-    get_language_keyboard,
-    get_voice_keyboard,
+    KeyboardCache,
     get_main_keyboard,
-    get_cancel_keyboard
+    get_cancel_keyboard,
+    get_samples_keyboard
+)
+from keyboards.callbacks import (
+    LanguagePageCallback,
+    LanguageCallback,
+    VoicePageCallback,
+    VoiceCallback,
+    language_code
+)
+from config import (
+    ELEVENLABS_API_KEY,
+    API_URL,
+    DATABASE_URL,
+    ELEVENLABS_CONNECTION_LIMIT,
+    ELEVENLABS_KEEPALIVE_TIMEOUT,
+    ELEVENLABS_DNS_CACHE_TTL,
+    TTS_CACHE_DIR,
+    TTS_CACHE_MEMORY_BYTES,
+    TTS_CACHE_DISK_BYTES,
+    TTS_MAX_CHUNK_CHARS,
+    TTS_CHUNK_CONCURRENCY,
+    TTS_SEND_FIRST_CHUNK,
+    ELEVENLABS_MAX_IN_FLIGHT,
+    ELEVENLABS_MAX_PER_USER,
+    ELEVENLABS_MAX_RETRIES,
+    ELEVENLABS_REQUEST_DEADLINE,
+    ELEVENLABS_BREAKER_THRESHOLD,
+    ELEVENLABS_BREAKER_RESET,
+    UPLOADS_DIR,
+    UPLOADS_MAX_TOTAL_BYTES,
+    UPLOADS_MAX_USER_BYTES,
+    UPLOADS_TTL,
+    CLONE_MAX_SAMPLES,
+    CLONE_MIN_DURATION,
+    AUDIO_WORKERS,
+    AUDIO_SAMPLE_RATE,
+    AUDIO_BITRATE,
+    AUDIO_SILENCE_THRESHOLD,
+    STS_SEGMENT_SECONDS,
+    STS_CONCURRENCY,
+    RATE_LIMIT_PER_SECOND,
+    RATE_LIMIT_BURST,
+    DAILY_CHARACTER_QUOTA,
+    DAILY_AUDIO_SECONDS_QUOTA,
+    JOB_WORKERS,
+    JOB_POLL_INTERVAL,
+    JOB_LEASE,
+    JOB_MAX_ATTEMPTS
 )
-from config import ELEVENLABS_API_KEY, API_URL, DATABASE_URL
 
 router = Router()
 db = Database(DATABASE_URL)
-elevenlabs_api = ElevenLabsAPI(ELEVENLABS_API_KEY, API_URL)
+elevenlabs_api = ElevenLabsAPI(
+    ELEVENLABS_API_KEY,
+    API_URL,
+    connection_limit=ELEVENLABS_CONNECTION_LIMIT,
+    keepalive_timeout=ELEVENLABS_KEEPALIVE_TIMEOUT,
+    dns_cache_ttl=ELEVENLABS_DNS_CACHE_TTL,
+    max_retries=ELEVENLABS_MAX_RETRIES,
+    request_deadline=ELEVENLABS_REQUEST_DEADLINE,
+    circuit_breaker=CircuitBreaker(ELEVENLABS_BREAKER_THRESHOLD, ELEVENLABS_BREAKER_RESET)
+)
+scheduler = RequestScheduler(
+    max_in_flight=ELEVENLABS_MAX_IN_FLIGHT,
+    max_per_user=ELEVENLABS_MAX_PER_USER
+)
+inflight = SingleFlight()
+job_queue = JobQueue(
+    db,
+    workers=JOB_WORKERS,
+    poll_interval=JOB_POLL_INTERVAL,
+    lease=JOB_LEASE,
+    max_attempts=JOB_MAX_ATTEMPTS
+)
+blob_store = BlobStore(
+    UPLOADS_DIR,
+    max_total_bytes=UPLOADS_MAX_TOTAL_BYTES,
+    max_user_bytes=UPLOADS_MAX_USER_BYTES,
+    ttl=UPLOADS_TTL
+)
+audio_processor = AudioProcessor(
+    max_workers=AUDIO_WORKERS,
+    sample_rate=AUDIO_SAMPLE_RATE,
+    bitrate=AUDIO_BITRATE,
+    silence_thresh=AUDIO_SILENCE_THRESHOLD
+)
+voice_catalog = VoiceCatalog(db)
+keyboard_cache = KeyboardCache(voice_catalog)
+tts_cache = AudioCache(
+    TTS_CACHE_DIR,
+    max_memory_bytes=TTS_CACHE_MEMORY_BYTES,
+    max_disk_bytes=TTS_CACHE_DISK_BYTES
+)
+
+
+registry.register_collector(lambda: {f"tts_cache_{name}": value for name, value in tts_cache.get_stats().items()})
+registry.register_collector(lambda: {f"elevenlabs_{name}": value for name, value in elevenlabs_api.stats.items()})
+registry.register_collector(lambda: {f"singleflight_{name}": value for name, value in inflight.stats.items()})
+registry.register_collector(lambda: {f"jobs_{name}": value for name, value in job_queue.stats.items()})
+registry.register_collector(lambda: {
+    **{f"scheduler_{name}": value for name, value in scheduler.stats.items()},
+    "elevenlabs_in_flight": scheduler.in_flight(),
+    "elevenlabs_queue_length": scheduler.queue_length()
+})
+
+router.message.middleware(RateLimitMiddleware(
+    db,
+    rate=RATE_LIMIT_PER_SECOND,
+    burst=RATE_LIMIT_BURST,
+    daily_characters=DAILY_CHARACTER_QUOTA,
+    daily_audio_seconds=DAILY_AUDIO_SECONDS_QUOTA
+))
 
 
 class VoiceStates(StatesGroup):
@@ -27,6 +155,164 @@ class VoiceStates(StatesGroup):
     waiting_for_voice_name = State()
 
 
+def tts_cache_key(text: str, voice_id: str) -> str:
+    return AudioCache.make_key(text, voice_id, TTS_MODEL_ID, TTS_VOICE_SETTINGS)
+
+
+def queue_notifier(bot: Bot, chat_id: int) -> Callable[[int], Awaitable]:
+    notified = False
+
+    async def notify(position: int):
+        nonlocal notified
+        if not notified:
+            notified = True
+            await bot.send_message(chat_id, f"⏳ Сервис сейчас загружен. Ваша позиция в очереди: {position}")
+
+    return notify
+
+
+async def synthesize(text: str, voice_id: str, user_id: int,
+                     priority: int = PRIORITY_TTS,
+                     on_queued: Optional[Callable[[int], Awaitable]] = None) -> bytes:
+    cache_key = tts_cache_key(text, voice_id)
+    audio = await tts_cache.get(cache_key)
+    if audio is None:
+        async def fetch() -> bytes:
+            result = await scheduler.run(
+                user_id,
+                priority,
+                lambda: elevenlabs_api.text_to_speech(
+                    text=text,
+                    voice_id=voice_id,
+                    model_id=TTS_MODEL_ID,
+                    **TTS_VOICE_SETTINGS
+                ),
+                on_queued=on_queued
+            )
+            await tts_cache.set(cache_key, result)
+            return result
+
+        audio, _ = await inflight.do(("tts", cache_key), fetch)
+    return audio
+
+
+async def synthesize_chunks(chunks: List[str], voice_id: str, user_id: int,
+                            on_first_chunk: Optional[Callable[[bytes], Awaitable]] = None,
+                            on_queued: Optional[Callable[[int], Awaitable]] = None) -> bytes:
+    semaphore = asyncio.Semaphore(TTS_CHUNK_CONCURRENCY)
+
+    async def run(chunk: str) -> bytes:
+        async with semaphore:
+            return await synthesize(chunk, voice_id, user_id, PRIORITY_LONG_TTS, on_queued)
+
+    tasks = [asyncio.create_task(run(chunk)) for chunk in chunks]
+    try:
+        if on_first_chunk:
+            await on_first_chunk(await tasks[0])
+        parts = await asyncio.gather(*tasks)
+    except Exception:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    return concat_mp3(parts)
+
+
+async def convert_speech(segments: List[bytes], user_id: int,
+                         on_progress: Callable[[int, int], Awaitable],
+                         on_queued: Optional[Callable[[int], Awaitable]] = None) -> bytes:
+    semaphore = asyncio.Semaphore(STS_CONCURRENCY)
+    done = 0
+
+    async def run(segment: bytes) -> bytes:
+        nonlocal done
+        async with semaphore:
+            converted = await scheduler.run(
+                user_id,
+                PRIORITY_STS,
+                lambda: elevenlabs_api.speech_to_speech(audio_data=segment),
+                on_queued=on_queued
+            )
+        done += 1
+        await on_progress(done, len(segments))
+        return converted
+
+    tasks = [asyncio.create_task(run(segment)) for segment in segments]
+    try:
+        parts = await asyncio.gather(*tasks)
+    except Exception:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    return concat_mp3(parts)
+
+
+async def send_tts_audio(message: Message, text: str, voice_id: str, cache_key: str, caption: str) -> Message:
+    audio = await tts_cache.get(cache_key)
+    if audio is not None:
+        return await message.answer_audio(BufferedInputFile(audio, filename="speech.mp3"), caption=caption)
+
+    async def stream_and_send() -> Message:
+        input_file = StreamInputFile(
+            elevenlabs_api.stream_text_to_speech(
+                text=text,
+                voice_id=voice_id,
+                model_id=TTS_MODEL_ID,
+                **TTS_VOICE_SETTINGS
+            ),
+            filename="speech.mp3"
+        )
+        try:
+            await input_file.prefetch()
+            return await message.answer_audio(input_file, caption=caption)
+        finally:
+            await input_file.aclose()
+            AUDIO_BYTES.inc(input_file.size, direction="telegram_upload")
+            if input_file.completed:
+                await tts_cache.set(cache_key, input_file.getvalue())
+
+    sent, shared = await inflight.do(
+        ("tts_stream", cache_key),
+        lambda: scheduler.run(
+            message.from_user.id,
+            PRIORITY_TTS,
+            stream_and_send,
+            on_queued=queue_notifier(message.bot, message.chat.id)
+        )
+    )
+    if shared:
+        # Another chat already uploaded this clip; Telegram file_ids are valid across chats
+        sent = await message.answer_audio(sent.audio.file_id, caption=caption)
+    return sent
+
+
+async def fetch_voices(user_id: int = 0, on_queued: Optional[Callable[[int], Awaitable]] = None) -> List[Dict]:
+    voices, _ = await inflight.do(
+        "voices",
+        lambda: scheduler.run(user_id, PRIORITY_BACKGROUND, elevenlabs_api.get_voices, on_queued=on_queued)
+    )
+    return voices
+
+
+async def answer_cached_audio(bot: Bot, chat_id: int, cache_key: str, caption: str) -> bool:
+    file_id = await db.get_audio_file_id(cache_key)
+    if not file_id:
+        return False
+
+    try:
+        await bot.send_audio(chat_id, file_id, caption=caption)
+        return True
+    except TelegramBadRequest:
+        await db.delete_audio_file_id(cache_key)
+        return False
+
+
+async def remember_file_id(sent: Message, cache_key: str):
+    if sent.audio:
+        await db.save_audio_file_id(cache_key, sent.audio.file_id)
+
+
 @router.message(Command("start"))
 async def start_command(message: Message):
     await message.answer(
@@ -38,10 +324,33 @@ async def start_command(message: Message):
     )
 
 
+@router.message(Command("stats"))
+async def stats_command(message: Message):
+    cache_stats = tts_cache.get_stats()
+    await message.answer(
+        "📊 Статистика\n\n"
+        f"Кэш TTS: {cache_stats['memory_hits']} попаданий в памяти, "
+        f"{cache_stats['disk_hits']} на диске, {cache_stats['misses']} промахов\n"
+        f"Вытеснено: {cache_stats['memory_evictions']} из памяти, "
+        f"{cache_stats['disk_evictions']} с диска\n"
+        f"Размер: {cache_stats['memory_bytes'] // 1024} КБ в памяти, "
+        f"{cache_stats['disk_bytes'] // 1024} КБ на диске\n\n"
+        f"Соединения ElevenLabs: {elevenlabs_api.stats['new_connections']} новых, "
+        f"{elevenlabs_api.stats['reused_connections']} повторно использованных\n"
+        f"Запросы к ElevenLabs: {scheduler.in_flight()} выполняется, "
+        f"{scheduler.queue_length()} в очереди (всего ожидали: {scheduler.stats['queued']} "
+        f"из {scheduler.stats['started']}, максимум очереди: {scheduler.stats['max_queue_length']})\n"
+        f"Объединено одинаковых запросов: {inflight.stats['coalesced']}\n"
+        f"Повторов: {elevenlabs_api.stats['retries']}, ошибок: {elevenlabs_api.stats['failures']}, "
+        f"отклонено при недоступности: {elevenlabs_api.stats['circuit_rejections']} "
+        f"(состояние: {elevenlabs_api.circuit_breaker.state})"
+    )
+
+
 @router.message(Command('generate'))
 async def generate_command(message: Message):
-    voices = await db.get_all_voices()
-    if not voices:
+    await voice_catalog.refresh()
+    if not voice_catalog.languages(message.from_user.id):
         await message.answer(
             "Голоса не найдены. Пожалуйста, используйте сначала команду /sync_voices"
         )
@@ -49,7 +358,7 @@ async def generate_command(message: Message):
 
     await message.answer(
         "Выберите язык для озвучки текста:",
-        reply_markup=get_language_keyboard(voices)
+        reply_markup=keyboard_cache.language_keyboard(user_id=message.from_user.id)
     )
 
 
@@ -57,41 +366,63 @@ async def generate_command(message: Message):
 async def sync_voices(message: Message):
     try:
         await message.answer("Начинаю синхронизацию голосов...")
-        voices = await elevenlabs_api.get_voices()
-        await db.clear_voices()
-
-        for voice in voices:
-            await db.add_voice(voice)
+        with span("sync.fetch") as fetch_span:
+            voices = await fetch_voices(message.from_user.id, queue_notifier(message.bot, message.chat.id))
+        with span("sync.db") as db_span:
+            changes = await voice_catalog.sync(voices)
 
-        await message.answer("✅ Голоса успешно синхронизированы!")
+        await message.answer(
+            f"✅ Голоса успешно синхронизированы! ({len(voices)} шт.)\n"
+            f"Добавлено: {changes['added']}, изменено: {changes['changed']}, удалено: {changes['removed']}\n\n"
+            f"⏱ ElevenLabs: {fetch_span.elapsed:.2f} с, база данных: {db_span.elapsed:.2f} с"
+        )
     except Exception as e:
         await message.answer(f"❌ Ошибка синхронизации голосов: {str(e)}")
 
 
-@router.callback_query(F.data.startswith('page_'))
-async def process_page_callback(callback_query: CallbackQuery):
-    page = int(callback_query.data.split('_')[1])
-    voices = await db.get_all_voices()
+@router.callback_query(LanguagePageCallback.filter())
+async def process_page_callback(callback_query: CallbackQuery, callback_data: LanguagePageCallback):
     await callback_query.message.edit_reply_markup(
-        reply_markup=get_language_keyboard(voices, page)
+        reply_markup=keyboard_cache.language_keyboard(callback_data.page, callback_query.from_user.id)
     )
 
 
-@router.callback_query(F.data.startswith("lang_"))
-async def process_language_selection(callback: CallbackQuery):
-    language = callback.data.split("_")[1]
-    voices = await db.get_voices_by_language(language)
+@router.callback_query(LanguageCallback.filter())
+async def process_language_selection(callback: CallbackQuery, callback_data: LanguageCallback):
+    language = language_code(callback_data.language)
+    if language is None:
+        await callback.answer("Язык не найден", show_alert=True)
+        return
 
     await callback.message.edit_text(
-        f"Выбранный язык: {language}\nВыберите голос:",
-        reply_markup=get_voice_keyboard(voices, language)
+        f"Выбранный язык: {language_name(language)}\nВыберите голос:",
+        reply_markup=keyboard_cache.voice_keyboard(language, user_id=callback.from_user.id)
     )
 
 
-@router.callback_query(F.data.startswith("voice_"))
-async def process_voice_selection(callback: CallbackQuery, state: FSMContext):
-    voice_id = callback.data.split("_")[1]
-    await state.update_data(voice_id=voice_id)
+@router.callback_query(VoicePageCallback.filter())
+async def process_voice_page(callback: CallbackQuery, callback_data: VoicePageCallback):
+    language = language_code(callback_data.language)
+    if language is None:
+        await callback.answer("Язык не найден", show_alert=True)
+        return
+
+    await callback.message.edit_reply_markup(
+        reply_markup=keyboard_cache.voice_keyboard(language, callback_data.page, callback.from_user.id)
+    )
+
+
+@router.callback_query(VoiceCallback.filter())
+async def process_voice_selection(callback: CallbackQuery, callback_data: VoiceCallback, state: FSMContext):
+    voice = voice_catalog.get_by_id(callback_data.voice, callback.from_user.id)
+    if voice is None:
+        await voice_catalog.refresh()
+        voice = voice_catalog.get_by_id(callback_data.voice, callback.from_user.id)
+    if voice is None:
+        await callback.answer("Голос не найден", show_alert=True)
+        return
+
+    await state.update_data(voice_id=voice['voice_id'])
     await state.set_state(VoiceStates.waiting_for_text)
 
     await callback.message.edit_text(
@@ -100,25 +431,47 @@ async def process_voice_selection(callback: CallbackQuery, state: FSMContext):
     )
 
 
-@router.message(VoiceStates.waiting_for_text)
+@router.message(VoiceStates.waiting_for_text, flags={"rate_limit": "tts"})
 async def process_text(message: Message, state: FSMContext):
     try:
         data = await state.get_data()
-        audio = await elevenlabs_api.text_to_speech(
-            text=message.text,
-            voice_id=data['voice_id']
-        )
+        cache_key = tts_cache_key(message.text, data['voice_id'])
+        with span("tts.file_id_lookup"):
+            answered = await answer_cached_audio(message.bot, message.chat.id, cache_key, "Вот ваше аудио!")
+        if answered:
+            await state.clear()
+            return
 
-        temp_file = f"temp_audio_{message.from_user.id}.mp3"
-        with open(temp_file, "wb") as f:
-            f.write(audio)
+        chunks = split_text(message.text, TTS_MAX_CHUNK_CHARS)
+        if len(chunks) > 1:
+            async def send_first_chunk(audio: bytes):
+                await message.answer_audio(
+                    BufferedInputFile(audio, filename="speech_part_1.mp3"),
+                    caption=f"▶️ Начало аудио (1/{len(chunks)}), полная версия готовится..."
+                )
+
+            with span("tts.synthesize_chunks"):
+                audio = await synthesize_chunks(
+                    chunks,
+                    data['voice_id'],
+                    message.from_user.id,
+                    on_first_chunk=send_first_chunk if TTS_SEND_FIRST_CHUNK else None,
+                    on_queued=queue_notifier(message.bot, message.chat.id)
+                )
+            with span("tts.upload"):
+                sent = await message.answer_audio(
+                    BufferedInputFile(audio, filename="speech.mp3"),
+                    caption="Вот ваше аудио!"
+                )
+            AUDIO_BYTES.inc(len(audio), direction="telegram_upload")
+            await remember_file_id(sent, cache_key)
+            await state.clear()
+            return
 
-        await message.answer_audio(
-            FSInputFile(temp_file),
-            caption="Вот ваше аудио!"
-        )
+        with span("tts.synthesize_and_upload"):
+            sent = await send_tts_audio(message, message.text, data['voice_id'], cache_key, "Вот ваше аудио!")
+        await remember_file_id(sent, cache_key)
 
-        os.remove(temp_file)
         await state.clear()
 
     except Exception as e:
@@ -132,10 +485,10 @@ async def process_text(message: Message, state: FSMContext):
 async def start_add_voice(message: Message, state: FSMContext):
     await state.set_state(VoiceStates.waiting_for_audio_file)
     await message.answer(
-        "📁 Отправьте аудиофайл для клонирования голоса.\n\n"
-        "📋 Требования к файлу:\n"
+        "📁 Отправьте один или несколько аудиофайлов для клонирования голоса.\n\n"
+        "📋 Требования к файлам:\n"
         "• Формат: mp3, wav, m4a\n"
-        "• Длительность: минимум 30 секунд чистой речи\n"
+        f"• Длительность: минимум {CLONE_MIN_DURATION} секунд чистой речи суммарно\n"
         "• Качество: хорошее качество записи без шумов\n"
         "• Содержание: только один голос без фоновой музыки\n\n"
         "💡 Рекомендации для лучшего результата:\n"
@@ -153,12 +506,10 @@ async def process_audio_file(message: Message, state: FSMContext):
             file_id = message.audio.file_id
             file_name = message.audio.file_name
             file_size = message.audio.file_size
-            duration = message.audio.duration
         elif message.document:
             file_id = message.document.file_id
             file_name = message.document.file_name
             file_size = message.document.file_size
-            duration = None
         else:
             await message.answer(
                 "❌ Пожалуйста, отправьте аудиофайл в формате mp3, wav или m4a"
@@ -177,73 +528,171 @@ async def process_audio_file(message: Message, state: FSMContext):
             )
             return
 
-        if duration and duration < 30:
+        data = await state.get_data()
+        voice_files = data.get('voice_files', [])
+        # Expiry is based on mtime, so keep earlier samples alive while the user is still uploading
+        if await blob_store.touch(voice_files):
+            await expire_samples(message, state, voice_files)
+            return
+        if len(voice_files) >= CLONE_MAX_SAMPLES:
             await message.answer(
-                "❌ Аудиофайл слишком короткий. Минимальная длительность - 30 секунд"
+                f"❌ Можно загрузить не больше {CLONE_MAX_SAMPLES} файлов. Нажмите «Готово».",
+                reply_markup=get_samples_keyboard()
             )
             return
 
-        await message.answer("⏳ Загружаю файл...")
-        file = await message.bot.get_file(file_id)
-        temp_filename = f"temp_voice_{message.from_user.id}{os.path.splitext(file_name)[1]}"
-        await message.bot.download_file(file.file_path, temp_filename)
-
-        with open(temp_filename, "rb") as f:
-            await state.update_data(voice_file=f.read())
-
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
+        with span("clone.download"):
+            upload_handle = await blob_store.save_from_telegram(
+                message.bot,
+                file_id,
+                message.from_user.id,
+                file_size,
+                os.path.splitext(file_name)[1]
+            )
+        AUDIO_BYTES.inc(file_size, direction="telegram_download")
+        handle = blob_store.derive(upload_handle, ".processed.mp3")
+        try:
+            with span("clone.preprocess"):
+                duration = await audio_processor.preprocess_file(
+                    blob_store.path(upload_handle),
+                    blob_store.path(handle)
+                )
+        except Exception:
+            await blob_store.delete(handle)
+            raise
+        finally:
+            await blob_store.delete(upload_handle)
+
+        voice_files = voice_files + [handle]
+        samples_duration = data.get('samples_duration', 0) + duration
+        await state.update_data(voice_files=voice_files, samples_duration=samples_duration)
 
-        await state.set_state(VoiceStates.waiting_for_voice_name)
         await message.answer(
-            "✅ Файл успешно загружен!\n\n"
-            "Теперь отправьте имя для этого голоса (максимум 32 символа)\n"
-            "💡 Совет: Используйте описательное имя, например: 'Мужской_голос_RU'",
-            reply_markup=get_cancel_keyboard()
+            f"✅ Файл {len(voice_files)} загружен (всего: {samples_duration:.0f} с).\n\n"
+            "Отправьте ещё образцы или нажмите «Готово».",
+            reply_markup=get_samples_keyboard()
         )
 
     except Exception as e:
-        if 'temp_filename' in locals() and os.path.exists(temp_filename):
-            os.remove(temp_filename)
         await message.answer(f"❌ Ошибка при обработке файла: {str(e)}")
-        await state.clear()
 
 
-@router.message(VoiceStates.waiting_for_voice_name)
+async def expire_samples(message: Message, state: FSMContext, voice_files: List[str]):
+    for handle in voice_files:
+        await blob_store.delete(handle)
+    await state.clear()
+    await message.answer("❌ Загруженные образцы устарели и были удалены. Начните заново с /add_voice")
+
+
+@router.callback_query(VoiceStates.waiting_for_audio_file, F.data == "samples_done")
+async def finish_samples(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    if not data.get('voice_files'):
+        await callback.answer("Сначала отправьте хотя бы один аудиофайл", show_alert=True)
+        return
+
+    if await blob_store.touch(data['voice_files']):
+        await callback.answer()
+        await expire_samples(callback.message, state, data['voice_files'])
+        return
+
+    if data.get('samples_duration', 0) < CLONE_MIN_DURATION:
+        await callback.answer(
+            f"Общая длительность образцов должна быть не меньше {CLONE_MIN_DURATION} секунд",
+            show_alert=True
+        )
+        return
+
+    await state.set_state(VoiceStates.waiting_for_voice_name)
+    # Redis keeps state and data under separate TTLs, so refresh the data along with the state
+    await state.set_data(data)
+    await callback.message.edit_text(
+        f"✅ Загружено образцов: {len(data['voice_files'])}\n\n"
+        "Теперь отправьте имя для этого голоса (максимум 32 символа)\n"
+        "💡 Совет: Используйте описательное имя, например: 'Мужской_голос_RU'",
+        reply_markup=get_cancel_keyboard()
+    )
+
+
+@router.message(VoiceStates.waiting_for_voice_name, flags={"rate_limit": "clone"})
 async def process_voice_name(message: Message, state: FSMContext):
     if len(message.text) > 32:
         await message.answer("❌ Имя слишком длинное. Используйте максимум 32 символа.")
         return
 
+    data = await state.get_data()
+    voice_files = data.get('voice_files')
+    # The FSM data may expire before the state does, taking the sample list with it
+    if not voice_files or await blob_store.touch(voice_files):
+        await expire_samples(message, state, voice_files or [])
+        return
+
     try:
-        data = await state.get_data()
+        await job_queue.enqueue("clone", message.from_user.id, message.chat.id, {
+            "name": message.text,
+            "voice_files": voice_files
+        })
+        await state.clear()
         await message.answer("⏳ Начинаю процесс клонирования голоса...")
 
-        voice_data = await elevenlabs_api.clone_voice(
-            name=message.text,
-            files=[data['voice_file']]
-        )
+    except Exception as e:
+        logging.exception(f"Failed to enqueue voice cloning for user {message.from_user.id}")
+        await message.answer(f"❌ Ошибка при клонировании голоса:\n{str(e)}")
+        for handle in voice_files:
+            await blob_store.delete(handle)
+        await state.clear()
 
-        voice_data.update({'gender': 'custom'})
-        await db.add_voice(voice_data)
 
-        await message.answer(
-            f"✅ Голос '{message.text}' успешно склонирован!\n\n"
-            f"Используйте команду /generate чтобы начать использовать этот голос."
-        )
-        await state.clear()
+async def run_clone_job(bot: Bot, job: Dict):
+    payload = job['payload']
+    if await blob_store.touch(payload['voice_files']):
+        raise BlobMissingError("Загруженные образцы устарели. Начните заново с /add_voice")
+
+    with span("clone.upload"):
+        try:
+            voice_data = await scheduler.run(
+                job['user_id'],
+                PRIORITY_BACKGROUND,
+                lambda: elevenlabs_api.clone_voice(
+                    name=payload['name'],
+                    file_paths=[blob_store.path(handle) for handle in payload['voice_files']]
+                ),
+                on_queued=queue_notifier(bot, job['chat_id'])
+            )
+        except FileNotFoundError as e:
+            raise BlobMissingError("Загруженные образцы устарели. Начните заново с /add_voice") from e
+
+    voice_data.update({'gender': 'custom', 'owner_user_id': job['user_id']})
+    await db.add_voice(voice_data)
+    # The stored row carries the primary key that voice keyboards use in callback data
+    voice_catalog.add(await db.get_voice(voice_data['voice_id']))
+
+    # Samples are kept until the last attempt so a retry can upload them again
+    for handle in payload['voice_files']:
+        await blob_store.delete(handle)
+
+    await bot.send_message(
+        job['chat_id'],
+        f"✅ Голос '{payload['name']}' успешно склонирован!\n\n"
+        f"Используйте команду /generate чтобы начать использовать этот голос."
+    )
 
-    except Exception as e:
-        print(e)
-        await message.answer(
-            f"❌ Ошибка при клонировании голоса:\n{str(e)}\n\n"
-            f"Убедитесь, что аудиофайл соответствует требованиям"
-        )
-        await state.clear()
+
+async def report_clone_failure(bot: Bot, job: Dict, error: Exception):
+    for handle in job['payload']['voice_files']:
+        await blob_store.delete(handle)
+    await bot.send_message(
+        job['chat_id'],
+        f"❌ Ошибка при клонировании голоса:\n{str(error)}\n\n"
+        f"Убедитесь, что аудиофайл соответствует требованиям"
+    )
 
 
 @router.callback_query(F.data == "cancel")
 async def cancel_operation(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    for handle in data.get('voice_files', []):
+        await blob_store.delete(handle)
     await state.clear()
     await callback.message.edit_text(
         "❌ Операция отменена."
@@ -252,55 +701,106 @@ async def cancel_operation(callback: CallbackQuery, state: FSMContext):
 
 @router.callback_query(F.data == "back_to_languages")
 async def back_to_languages(callback: CallbackQuery):
-    voices = await db.get_all_voices()
+    await voice_catalog.refresh()
     await callback.message.edit_text(
         "Выберите язык для озвучки текста:",
-        reply_markup=get_language_keyboard(voices)
+        reply_markup=keyboard_cache.language_keyboard(user_id=callback.from_user.id)
     )
 
 
-@router.message(~F.state, F.voice | F.audio)
+@router.message(~F.state, F.voice | F.audio, flags={"rate_limit": "sts"})
 async def handle_voice_message(message: Message):
     try:
         processing_msg = await message.answer("⏳ Обрабатываю аудио...")
+        media = message.voice or message.audio
 
-        if message.voice:
-            file_id = message.voice.file_id
-            file_name = f"voice_{message.from_user.id}.ogg"
-        else:
-            file_id = message.audio.file_id
-            file_name = message.audio.file_name or f"audio_{message.from_user.id}.mp3"
+        cache_key = f"sts_{media.file_unique_id}"
+        if await answer_cached_audio(message.bot, message.chat.id, cache_key, "🎤 Речь преобразована"):
+            await message.bot.delete_message(chat_id=message.chat.id, message_id=processing_msg.message_id)
+            return
+
+        await job_queue.enqueue("sts", message.from_user.id, message.chat.id, {
+            "file_id": media.file_id,
+            "file_unique_id": media.file_unique_id,
+            "is_voice": message.voice is not None,
+            "processing_message_id": processing_msg.message_id
+        })
+
+    except Exception as e:
+        await message.answer(f"❌ Произошла ошибка при обработке аудио: {str(e)}")
 
-        file = await message.bot.get_file(file_id)
-        temp_input_file = f"temp_input_{message.from_user.id}{os.path.splitext(file_name)[1]}"
-        await message.bot.download_file(file.file_path, temp_input_file)
 
-        with open(temp_input_file, "rb") as f:
-            audio_bytes = f.read()
+async def run_sts_job(bot: Bot, job: Dict):
+    payload = job['payload']
+    chat_id = job['chat_id']
+    cache_key = f"sts_{payload['file_unique_id']}"
 
-        converted_audio = await elevenlabs_api.speech_to_speech(
-            audio_data=audio_bytes
+    with span("sts.download"):
+        file = await bot.get_file(payload['file_id'])
+        audio_buffer = await bot.download_file(file.file_path)
+    AUDIO_BYTES.inc(audio_buffer.getbuffer().nbytes, direction="telegram_download")
+
+    with span("sts.preprocess"):
+        segments, _ = await audio_processor.preprocess_segments(
+            audio_buffer.getvalue(),
+            "ogg" if payload['is_voice'] else None,
+            max_segment_seconds=STS_SEGMENT_SECONDS
         )
+    audio_buffer.close()
+
+    last_edit = 0.0
 
-        temp_output_file = f"temp_output_{message.from_user.id}.mp3"
-        with open(temp_output_file, "wb") as f:
-            f.write(converted_audio)
+    async def report_progress(done: int, total: int):
+        nonlocal last_edit
+        if total == 1 or done == total or time.monotonic() - last_edit < 1:
+            return
+        last_edit = time.monotonic()
+        try:
+            await bot.edit_message_text(
+                f"⏳ Обрабатываю аудио... {done}/{total}",
+                chat_id=chat_id,
+                message_id=payload['processing_message_id']
+            )
+        except TelegramBadRequest:
+            pass
+
+    with span("sts.convert"):
+        converted_audio = await convert_speech(
+            segments,
+            job['user_id'],
+            report_progress,
+            on_queued=queue_notifier(bot, chat_id)
+        )
 
-        await message.answer_audio(
-            FSInputFile(temp_output_file, filename="converted_speech.mp3"),
+    with span("sts.upload"):
+        sent = await bot.send_audio(
+            chat_id,
+            BufferedInputFile(converted_audio, filename="converted_speech.mp3"),
             caption="🎤 Речь преобразована"
         )
+    AUDIO_BYTES.inc(len(converted_audio), direction="telegram_upload")
+    await remember_file_id(sent, cache_key)
 
-        if os.path.exists(temp_input_file):
-            os.remove(temp_input_file)
-        if os.path.exists(temp_output_file):
-            os.remove(temp_output_file)
+    try:
+        await bot.delete_message(chat_id=chat_id, message_id=payload['processing_message_id'])
+    except TelegramBadRequest:
+        pass
 
-        await message.bot.delete_message(chat_id=message.chat.id, message_id=processing_msg.message_id)
 
-    except Exception as e:
-        await message.answer(f"❌ Произошла ошибка при обработке аудио: {str(e)}")
+async def report_sts_failure(bot: Bot, job: Dict, error: Exception):
+    await bot.send_message(job['chat_id'], f"❌ Произошла ошибка при обработке аудио: {str(error)}")
+
+
+@router.callback_query(F.data == "current_page")
+async def current_page(callback: CallbackQuery):
+    await callback.answer()
+
+
+# Registered last: catches buttons from keyboards sent before the callback format changed
+@router.callback_query()
+async def stale_callback(callback: CallbackQuery):
+    await callback.answer("Меню устарело, используйте /generate", show_alert=True)
+
 
-        for filename in ['temp_input_file', 'temp_output_file']:
-            if filename in locals() and os.path.exists(locals()[filename]):
-                os.remove(locals()[filename])
+job_queue.register("sts", run_sts_job, on_failure=report_sts_failure)
+job_queue.register("clone", run_clone_job, on_failure=report_clone_failure)
@@ -0,0 +1,35 @@
+from typing import Optional
+
+from aiogram.filters.callback_data import CallbackData
+
+from services.elevenlabs import LANGUAGE_MAPPING
+
+# Languages travel as their position in LANGUAGE_MAPPING, so new codes must only be appended
+LANGUAGE_CODES = list(LANGUAGE_MAPPING)
+_LANGUAGE_INDEXES = {code: index for index, code in enumerate(LANGUAGE_CODES)}
+
+
+def language_index(code: str) -> int:
+    return _LANGUAGE_INDEXES[code]
+
+
+def language_code(index: int) -> Optional[str]:
+    return LANGUAGE_CODES[index] if 0 <= index < len(LANGUAGE_CODES) else None
+
+
+class LanguagePageCallback(CallbackData, prefix="lp"):
+    page: int
+
+
+class LanguageCallback(CallbackData, prefix="l"):
+    language: int
+
+
+class VoicePageCallback(CallbackData, prefix="vp"):
+    language: int
+    page: int
+
+
+class VoiceCallback(CallbackData, prefix="v"):
+    # Voice.id primary key rather than the 20+ character ElevenLabs voice_id
+    voice: int
@@ -1,4 +1,5 @@
-from typing import List, Dict
+from collections import OrderedDict
+from typing import Callable, List, Dict, Optional
 
 
 from aiogram.types import (
@@ -8,32 +9,28 @@ from aiogram.types import (
     KeyboardButton
 )
 
+from services.catalog import VoiceCatalog
+from services.elevenlabs import language_name
+from keyboards.callbacks import (
+    LanguagePageCallback,
+    LanguageCallback,
+    VoicePageCallback,
+    VoiceCallback,
+    language_index
+)
 
-def get_language_keyboard(voices: List[Dict], page: int = 0) -> InlineKeyboardMarkup:
-    languages = sorted(set(voice['language'] for voice in voices))
-    LANGUAGES_PER_PAGE = 6
-    total_pages = (len(languages) + LANGUAGES_PER_PAGE - 1) // LANGUAGES_PER_PAGE
 
-    start_idx = page * LANGUAGES_PER_PAGE
-    end_idx = start_idx + LANGUAGES_PER_PAGE
-    current_page_languages = languages[start_idx:end_idx]
+LANGUAGES_PER_PAGE = 6
+VOICES_PER_PAGE = 8
 
-    keyboard = []
-
-    for language in current_page_languages:
-        keyboard.append([
-            InlineKeyboardButton(
-                text=language,
-                callback_data=f"lang_{language}"
-            )
-        ])
 
+def _page_buttons(page: int, total_pages: int, page_callback: Callable[[int], str]) -> List[InlineKeyboardButton]:
     nav_buttons = []
     if page > 0:
         nav_buttons.append(
             InlineKeyboardButton(
                 text="⬅️ Назад",
-                callback_data=f"page_{page - 1}"
+                callback_data=page_callback(page - 1)
             )
         )
 
@@ -48,11 +45,31 @@ def get_language_keyboard(voices: List[Dict], page: int = 0) -> InlineKeyboardMa
         nav_buttons.append(
             InlineKeyboardButton(
                 text="Далее ➡️",
-                callback_data=f"page_{page + 1}"
+                callback_data=page_callback(page + 1)
             )
         )
+    return nav_buttons
+
+
+def build_language_keyboard(languages: List[str], page: int = 0) -> InlineKeyboardMarkup:
+    total_pages = max(1, (len(languages) + LANGUAGES_PER_PAGE - 1) // LANGUAGES_PER_PAGE)
+    page = min(max(page, 0), total_pages - 1)
+
+    start_idx = page * LANGUAGES_PER_PAGE
+    end_idx = start_idx + LANGUAGES_PER_PAGE
+    current_page_languages = languages[start_idx:end_idx]
+
+    keyboard = []
 
-    keyboard.append(nav_buttons)
+    for language in current_page_languages:
+        keyboard.append([
+            InlineKeyboardButton(
+                text=language_name(language),
+                callback_data=LanguageCallback(language=language_index(language)).pack()
+            )
+        ])
+
+    keyboard.append(_page_buttons(page, total_pages, lambda n: LanguagePageCallback(page=n).pack()))
 
     keyboard.append([
         InlineKeyboardButton(
@@ -64,36 +81,53 @@ def get_language_keyboard(voices: List[Dict], page: int = 0) -> InlineKeyboardMa
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-def get_voice_keyboard(voices: List[Dict], language: str) -> InlineKeyboardMarkup:
+def build_voice_keyboard(voices: List[Dict], language: str = "", page: int = 0) -> InlineKeyboardMarkup:
     keyboard = []
 
-    male_voices = [v for v in voices if v['gender'] == 'male' and v['language'] == language]
-    female_voices = [v for v in voices if v['gender'] == 'female' and v['language'] == language]
-    cloned_voices = [v for v in voices if v['is_cloned'] and v['language'] == language]
-
-    if male_voices:
+    male_voice = None
+    female_voice = None
+    cloned_voices = []
+    for voice in voices:
+        if voice['gender'] == 'male' and male_voice is None:
+            male_voice = voice
+        elif voice['gender'] == 'female' and female_voice is None:
+            female_voice = voice
+        if voice['is_cloned']:
+            cloned_voices.append(voice)
+
+    total_pages = max(1, (len(cloned_voices) + VOICES_PER_PAGE - 1) // VOICES_PER_PAGE)
+    page = min(max(page, 0), total_pages - 1)
+
+    if page == 0 and male_voice:
         keyboard.append([
             InlineKeyboardButton(
-                text=f"Male: {male_voices[0]['name']}",
-                callback_data=f"voice_{male_voices[0]['voice_id']}"
+                text=f"Male: {male_voice['name']}",
+                callback_data=VoiceCallback(voice=male_voice['id']).pack()
             )
         ])
-    if female_voices:
+    if page == 0 and female_voice:
         keyboard.append([
             InlineKeyboardButton(
-                text=f"Female: {female_voices[0]['name']}",
-                callback_data=f"voice_{female_voices[0]['voice_id']}"
+                text=f"Female: {female_voice['name']}",
+                callback_data=VoiceCallback(voice=female_voice['id']).pack()
             )
         ])
 
-    for voice in cloned_voices:
+    for voice in cloned_voices[page * VOICES_PER_PAGE:(page + 1) * VOICES_PER_PAGE]:
         keyboard.append([
             InlineKeyboardButton(
                 text=f"Custom: {voice['name']}",
-                callback_data=f"voice_{voice['voice_id']}"
+                callback_data=VoiceCallback(voice=voice['id']).pack()
             )
         ])
 
+    if total_pages > 1:
+        keyboard.append(_page_buttons(
+            page,
+            total_pages,
+            lambda n: VoicePageCallback(language=language_index(language), page=n).pack()
+        ))
+
     keyboard.append([
         InlineKeyboardButton(
             text="Back",
@@ -104,6 +138,47 @@ def get_voice_keyboard(voices: List[Dict], language: str) -> InlineKeyboardMarku
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+class KeyboardCache:
+    def __init__(self, catalog: VoiceCatalog, max_keyboards: int = 1024):
+        self.catalog = catalog
+        self.max_keyboards = max_keyboards
+        self._version = None
+        self._keyboards: "OrderedDict[tuple, InlineKeyboardMarkup]" = OrderedDict()
+
+    def _get(self, key: tuple, build: Callable[[], InlineKeyboardMarkup]) -> InlineKeyboardMarkup:
+        if self._version != self.catalog.version:
+            self._keyboards.clear()
+            self._version = self.catalog.version
+
+        keyboard = self._keyboards.get(key)
+        if keyboard is None:
+            keyboard = build()
+            self._keyboards[key] = keyboard
+            if len(self._keyboards) > self.max_keyboards:
+                self._keyboards.popitem(last=False)
+        else:
+            self._keyboards.move_to_end(key)
+        return keyboard
+
+    def _scope(self, user_id: Optional[int]) -> Optional[int]:
+        # Users without cloned voices of their own share the library keyboards
+        return user_id if self.catalog.owns_voices(user_id) else None
+
+    def language_keyboard(self, page: int = 0, user_id: Optional[int] = None) -> InlineKeyboardMarkup:
+        owner = self._scope(user_id)
+        return self._get(
+            ("languages", owner, page),
+            lambda: build_language_keyboard(sorted(self.catalog.languages(owner), key=language_name), page)
+        )
+
+    def voice_keyboard(self, language: str, page: int = 0, user_id: Optional[int] = None) -> InlineKeyboardMarkup:
+        owner = self._scope(user_id)
+        return self._get(
+            ("voices", owner, language, page),
+            lambda: build_voice_keyboard(self.catalog.by_language(language, owner), language, page)
+        )
+
+
 def get_main_keyboard() -> ReplyKeyboardMarkup:
     keyboard = [
         [KeyboardButton(text="/add_voice")],
@@ -122,3 +197,12 @@ def get_cancel_keyboard() -> InlineKeyboardMarkup:
             )
         ]]
     )
+
+
+def get_samples_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="✅ Готово", callback_data="samples_done")],
+            [InlineKeyboardButton(text="Cancel", callback_data="cancel")]
+        ]
+    )
@@ -0,0 +1,96 @@
+import time
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import Message
+
+from database.database import Database
+
+
+class TokenBucket:
+    # Buckets live in process memory: with N replicas behind a load balancer a user gets up to
+    # N times the configured rate, so set RATE_LIMIT_PER_SECOND per replica (total / N).
+    # The daily quotas are enforced in the database and are shared by all replicas.
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets: Dict[int, Tuple[float, float]] = {}
+
+    def consume(self, user_id: int) -> bool:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(user_id, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated_at) * self.rate)
+
+        if tokens < 1:
+            self._buckets[user_id] = (tokens, now)
+            return False
+
+        self._buckets[user_id] = (tokens - 1, now)
+        if len(self._buckets) > 10000:
+            self._prune(now)
+        return True
+
+    def _prune(self, now: float):
+        # A bucket that would be full again carries no state worth keeping
+        refill_time = self.capacity / self.rate
+        self._buckets = {
+            user_id: bucket
+            for user_id, bucket in self._buckets.items()
+            if now - bucket[1] < refill_time
+        }
+
+
+class RateLimitMiddleware(BaseMiddleware):
+    def __init__(self, db: Database, rate: float, burst: int,
+                 daily_characters: int, daily_audio_seconds: int):
+        self.db = db
+        self.bucket = TokenBucket(rate, burst)
+        self.daily_characters = daily_characters
+        self.daily_audio_seconds = daily_audio_seconds
+
+    async def __call__(self,
+                       handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+                       event: Message,
+                       data: Dict[str, Any]) -> Any:
+        kind = get_flag(data, "rate_limit")
+        if not kind or not event.from_user:
+            return await handler(event, data)
+
+        user_id = event.from_user.id
+        if not self.bucket.consume(user_id):
+            await event.answer("⏳ Слишком много запросов. Подождите немного и попробуйте снова.")
+            return None
+
+        characters = len(event.text or "") if kind == "tts" else 0
+        audio_seconds = 0
+        if kind == "sts":
+            media = event.voice or event.audio
+            audio_seconds = media.duration if media else 0
+
+        if characters or audio_seconds:
+            today = date.today()
+            accepted = await self.db.try_add_usage(
+                user_id,
+                today,
+                characters,
+                audio_seconds,
+                self.daily_characters,
+                self.daily_audio_seconds
+            )
+            if not accepted:
+                usage = await self.db.get_usage(user_id, today)
+                if usage['characters'] + characters > self.daily_characters:
+                    await event.answer(
+                        f"❌ Дневной лимит символов исчерпан "
+                        f"({usage['characters']}/{self.daily_characters}). Попробуйте завтра."
+                    )
+                else:
+                    await event.answer(
+                        f"❌ Дневной лимит аудио исчерпан "
+                        f"({usage['audio_seconds']:.0f}/{self.daily_audio_seconds} с). Попробуйте завтра."
+                    )
+                return None
+
+        return await handler(event, data)
@@ -0,0 +1,19 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from services.metrics import UPDATES, set_trace_id, trace_id_var
+
+
+class TracingMiddleware(BaseMiddleware):
+    async def __call__(self,
+                       handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+                       event: Update,
+                       data: Dict[str, Any]) -> Any:
+        token = set_trace_id()
+        UPDATES.inc(type=event.event_type)
+        try:
+            return await handler(event, data)
+        finally:
+            trace_id_var.reset(token)
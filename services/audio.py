@@ -0,0 +1,145 @@
+import asyncio
+import io
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+
+def _strip_id3v2(data: bytes) -> bytes:
+    if len(data) < 10 or data[:3] != b"ID3":
+        return data
+
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+
+    header_size = 10 + size
+    if data[5] & 0x10:
+        header_size += 10
+    return data[header_size:]
+
+
+def _strip_id3v1(data: bytes) -> bytes:
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        return data[:-128]
+    return data
+
+
+def concat_mp3(parts: List[bytes]) -> bytes:
+    # MP3 frames are self-contained, so dropping the inner ID3 tags is enough for gapless playback
+    result = bytearray()
+    for i, part in enumerate(parts):
+        if i > 0:
+            part = _strip_id3v2(part)
+        if i < len(parts) - 1:
+            part = _strip_id3v1(part)
+        result.extend(part)
+    return bytes(result)
+
+
+def _normalize(sound, sample_rate: int, channels: int, silence_thresh: float):
+    from pydub.silence import detect_leading_silence
+
+    start = detect_leading_silence(sound, silence_threshold=silence_thresh)
+    end = len(sound) - detect_leading_silence(sound.reverse(), silence_threshold=silence_thresh)
+    if start < end:
+        sound = sound[start:end]
+    return sound.set_channels(channels).set_frame_rate(sample_rate)
+
+
+def _find_cut_points(sound, max_segment_ms: int, min_silence_ms: int, silence_thresh: float) -> List[int]:
+    from pydub.silence import detect_silence
+
+    silences = [
+        (start + end) // 2
+        for start, end in detect_silence(sound, min_silence_len=min_silence_ms, silence_thresh=silence_thresh)
+    ]
+
+    cuts = []
+    segment_start = 0
+    while len(sound) - segment_start > max_segment_ms:
+        limit = segment_start + max_segment_ms
+        candidates = [point for point in silences if segment_start < point <= limit]
+        cut = candidates[-1] if candidates else limit
+        cuts.append(cut)
+        segment_start = cut
+    return cuts
+
+
+def _preprocess_segments(data: bytes, input_format: Optional[str], sample_rate: int, channels: int,
+                         bitrate: str, silence_thresh: float,
+                         max_segment_ms: int, min_silence_ms: int) -> Tuple[List[bytes], float]:
+    from pydub import AudioSegment
+
+    sound = AudioSegment.from_file(io.BytesIO(data), format=input_format)
+    sound = _normalize(sound, sample_rate, channels, silence_thresh)
+
+    bounds = [0] + _find_cut_points(sound, max_segment_ms, min_silence_ms, silence_thresh) + [len(sound)]
+    segments = []
+    for start, end in zip(bounds, bounds[1:]):
+        output = io.BytesIO()
+        sound[start:end].export(output, format="mp3", bitrate=bitrate)
+        segments.append(output.getvalue())
+    return segments, len(sound) / 1000
+
+
+def _preprocess_file(input_path: str, output_path: str, sample_rate: int, channels: int,
+                     bitrate: str, silence_thresh: float) -> float:
+    from pydub import AudioSegment
+
+    sound = AudioSegment.from_file(input_path)
+    sound = _normalize(sound, sample_rate, channels, silence_thresh)
+    sound.export(output_path, format="mp3", bitrate=bitrate)
+    return len(sound) / 1000
+
+
+class AudioProcessor:
+    def __init__(self, max_workers: int = 2,
+                 sample_rate: int = 24000,
+                 channels: int = 1,
+                 bitrate: str = "64k",
+                 silence_thresh: float = -50.0):
+        self.max_workers = max_workers
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.bitrate = bitrate
+        self.silence_thresh = silence_thresh
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def preprocess_segments(self, data: bytes, input_format: Optional[str] = None,
+                                  max_segment_seconds: float = 60,
+                                  min_silence_ms: int = 300) -> Tuple[List[bytes], float]:
+        # Decoding and encoding are CPU bound, so they run in worker processes off the event loop
+        return await asyncio.get_running_loop().run_in_executor(
+            self._get_executor(),
+            _preprocess_segments,
+            data,
+            input_format,
+            self.sample_rate,
+            self.channels,
+            self.bitrate,
+            self.silence_thresh,
+            int(max_segment_seconds * 1000),
+            min_silence_ms
+        )
+
+    async def preprocess_file(self, input_path: str, output_path: str) -> float:
+        return await asyncio.get_running_loop().run_in_executor(
+            self._get_executor(),
+            _preprocess_file,
+            input_path,
+            output_path,
+            self.sample_rate,
+            self.channels,
+            self.bitrate,
+            self.silence_thresh
+        )
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import List
+
+from aiogram import Bot
+
+
+class BlobQuotaError(Exception):
+    pass
+
+
+class BlobMissingError(Exception):
+    # Expired uploads won't come back, so a job that needs them must not be retried
+    retryable = False
+
+
+class BlobStore:
+    def __init__(self, root: str,
+                 max_total_bytes: int = 2 * 1024 * 1024 * 1024,
+                 max_user_bytes: int = 200 * 1024 * 1024,
+                 ttl: int = 3600):
+        self.root = root
+        self.max_total_bytes = max_total_bytes
+        self.max_user_bytes = max_user_bytes
+        self.ttl = ttl
+
+    def path(self, handle: str) -> str:
+        user_dir, name = handle.split("/", 1)
+        if not user_dir.isdigit() or "/" in name or name.startswith("."):
+            raise ValueError(f"Invalid blob handle: {handle}")
+        return os.path.join(self.root, user_dir, name)
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        total = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, filename))
+                except FileNotFoundError:
+                    pass
+        return total
+
+    def _check_quota(self, user_id: int, size: int):
+        if self._dir_size(os.path.join(self.root, str(user_id))) + size > self.max_user_bytes:
+            raise BlobQuotaError("Превышен лимит загруженных файлов. Завершите или отмените текущее клонирование.")
+        if self._dir_size(self.root) + size > self.max_total_bytes:
+            raise BlobQuotaError("Хранилище временно переполнено. Попробуйте позже.")
+
+    async def save_from_telegram(self, bot: Bot, file_id: str, user_id: int, size: int, suffix: str) -> str:
+        await asyncio.to_thread(self._check_quota, user_id, size)
+
+        handle = f"{user_id}/{uuid.uuid4().hex}{suffix.lower()}"
+        path = self.path(handle)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        file = await bot.get_file(file_id)
+        try:
+            await bot.download_file(file.file_path, path)
+        except Exception:
+            await self.delete(handle)
+            raise
+        return handle
+
+    def derive(self, handle: str, suffix: str) -> str:
+        return f"{os.path.splitext(handle)[0]}{suffix}"
+
+    def _touch(self, handles: List[str]) -> List[str]:
+        missing = []
+        for handle in handles:
+            try:
+                os.utime(self.path(handle))
+            except FileNotFoundError:
+                missing.append(handle)
+        return missing
+
+    async def touch(self, handles: List[str]) -> List[str]:
+        """Extends the TTL of the given uploads and returns the handles that have already expired."""
+        return await asyncio.to_thread(self._touch, handles)
+
+    async def delete(self, handle: str):
+        try:
+            await asyncio.to_thread(os.remove, self.path(handle))
+        except FileNotFoundError:
+            pass
+
+    def _cleanup(self) -> int:
+        if not os.path.isdir(self.root):
+            return 0
+
+        removed = 0
+        expires_before = time.time() - self.ttl
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    if os.path.getmtime(path) < expires_before:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    async def run_cleanup(self, interval: float = 600):
+        while True:
+            removed = await asyncio.to_thread(self._cleanup)
+            if removed:
+                logging.info(f"Removed {removed} expired uploads")
+            await asyncio.sleep(interval)
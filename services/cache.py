@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import json
+import os
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class AudioCache:
+    def __init__(self, cache_dir: str,
+                 max_memory_bytes: int = 64 * 1024 * 1024,
+                 max_disk_bytes: int = 1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._disk_loaded = False
+        # Guards only the one-off index scan; index updates never span an await, so the hot path stays lock-free
+        self._index_lock = asyncio.Lock()
+
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0
+        }
+
+    @staticmethod
+    def make_key(text: str, voice_id: str, model_id: str, voice_settings: Dict) -> str:
+        payload = json.dumps(
+            [text, voice_id, model_id, voice_settings],
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def _load_disk_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".mp3"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    async def _ensure_disk_loaded(self):
+        if self._disk_loaded:
+            return
+        async with self._index_lock:
+            if not self._disk_loaded:
+                await asyncio.to_thread(self._load_disk_index)
+                self._disk_loaded = True
+
+    def _put_memory(self, key: str, audio: bytes):
+        if len(audio) > self.max_memory_bytes:
+            return
+
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.stats["memory_evictions"] += 1
+
+    def _read_file(self, key: str) -> bytes:
+        path = self._path(key)
+        with open(path, "rb") as f:
+            audio = f.read()
+        os.utime(path)
+        return audio
+
+    def _write_file(self, key: str, audio: bytes):
+        path = self._path(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(audio)
+        os.replace(temp_path, path)
+
+    def _remove_files(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    async def get(self, key: str) -> Optional[bytes]:
+        audio = self._memory.get(key)
+        if audio is not None:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return audio
+
+        await self._ensure_disk_loaded()
+        if key not in self._disk:
+            self.stats["misses"] += 1
+            return None
+
+        try:
+            audio = await asyncio.to_thread(self._read_file, key)
+        except FileNotFoundError:
+            # Evicted while the read was in flight
+            if key in self._disk:
+                self._disk_bytes -= self._disk.pop(key)
+            self.stats["misses"] += 1
+            return None
+
+        if key in self._disk:
+            self._disk.move_to_end(key)
+        self._put_memory(key, audio)
+        self.stats["disk_hits"] += 1
+        return audio
+
+    async def set(self, key: str, audio: bytes):
+        self._put_memory(key, audio)
+
+        await self._ensure_disk_loaded()
+        if len(audio) > self.max_disk_bytes:
+            return
+
+        await asyncio.to_thread(self._write_file, key, audio)
+        if key in self._disk:
+            self._disk_bytes -= self._disk.pop(key)
+        self._disk[key] = len(audio)
+        self._disk_bytes += len(audio)
+
+        evicted = []
+        while self._disk_bytes > self.max_disk_bytes:
+            evicted_key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            evicted.append(evicted_key)
+
+        if evicted:
+            self.stats["disk_evictions"] += len(evicted)
+            await asyncio.to_thread(self._remove_files, evicted)
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes
+        }
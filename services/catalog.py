@@ -0,0 +1,113 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Dict, Optional
+
+from database.database import Database, voice_content_hash
+
+
+class VoiceCatalog:
+    def __init__(self, db: Database):
+        self.db = db
+        self.version = 0
+        self._stored_version: Optional[int] = None
+        self._voices: Dict[str, Dict] = {}
+        self._by_id: Dict[int, Dict] = {}
+        # Keyed by (language, owner_user_id); owner None holds the shared library voices
+        self._by_language: Dict[tuple, List[Dict]] = {}
+        self._languages: Dict[Optional[int], set] = {}
+
+    async def load(self):
+        # Read the version first: a write that lands in between triggers another reload on refresh()
+        stored_version = await self.db.get_catalog_version()
+        voices = await self.db.get_all_voices()
+        self._rebuild(voices)
+        self._stored_version = stored_version
+        logging.info(f"Voice catalog loaded: {len(voices)} voices")
+
+    async def refresh(self):
+        # Picks up voices written by other processes (job workers, webhook replicas)
+        if await self.db.get_catalog_version() != self._stored_version:
+            await self.load()
+
+    def _rebuild(self, voices: List[Dict]):
+        by_voice_id = {}
+        by_id = {}
+        by_language = {}
+        languages = {}
+
+        for voice in voices:
+            owner = voice.get('owner_user_id')
+            by_voice_id[voice['voice_id']] = voice
+            by_id[voice['id']] = voice
+            by_language.setdefault((voice['language'], owner), []).append(voice)
+            languages.setdefault(owner, set()).add(voice['language'])
+
+        # Indexes are swapped together so readers never see a half-built catalog
+        self._voices, self._by_id, self._by_language, self._languages = (
+            by_voice_id, by_id, by_language, languages
+        )
+        self.version += 1
+
+    def add(self, voice: Dict):
+        voices = [v for v in self._voices.values() if v['voice_id'] != voice['voice_id']]
+        voices.append(voice)
+        self._rebuild(voices)
+
+    async def sync(self, voices: List[Dict]) -> Dict[str, int]:
+        stored = await self.db.get_voice_hashes()
+        fetched = {voice['voice_id']: voice for voice in voices}
+        hashes = {voice_id: voice_content_hash(voice) for voice_id, voice in fetched.items()}
+
+        added = [voice for voice_id, voice in fetched.items() if voice_id not in stored]
+        changed = [voice for voice_id, voice in fetched.items()
+                   if voice_id in stored and stored[voice_id]['content_hash'] != hashes[voice_id]]
+        # Owned voices are never removed by a diff: a clone stored after the /voices snapshot
+        # would otherwise be deleted and later re-added without its owner
+        removed = [voice_id for voice_id, row in stored.items()
+                   if voice_id not in fetched and row['owner_user_id'] is None]
+
+        if added or changed or removed:
+            await self.db.apply_voice_changes(added + changed, removed)
+
+        # Another replica may have written the changes already, so compare the in-memory copy too
+        if added or changed or removed or hashes != {
+            voice_id: voice_content_hash(voice) for voice_id, voice in self._voices.items()
+            if voice_id in fetched or voice.get('owner_user_id') is None
+        }:
+            await self.load()
+
+        return {"added": len(added), "changed": len(changed), "removed": len(removed)}
+
+    async def run_periodic_sync(self, fetch: Callable[[], Awaitable[List[Dict]]], interval: float = 3600):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                changes = await self.sync(await fetch())
+                if any(changes.values()):
+                    logging.info(f"Voice catalog synced: {changes}")
+            except Exception:
+                logging.exception("Periodic voice sync failed")
+
+    def owns_voices(self, user_id: Optional[int]) -> bool:
+        return user_id is not None and user_id in self._languages
+
+    def languages(self, user_id: Optional[int] = None) -> List[str]:
+        languages = self._languages.get(None, set())
+        if self.owns_voices(user_id):
+            languages = languages | self._languages[user_id]
+        return sorted(languages)
+
+    def by_language(self, language: str, user_id: Optional[int] = None) -> List[Dict]:
+        shared = self._by_language.get((language, None), [])
+        if not self.owns_voices(user_id):
+            return shared
+        return self._by_language.get((language, user_id), []) + shared
+
+    @staticmethod
+    def _visible(voice: Optional[Dict], user_id: Optional[int]) -> Optional[Dict]:
+        if voice is None or voice.get('owner_user_id') not in (None, user_id):
+            return None
+        return voice
+
+    def get_by_id(self, id: int, user_id: Optional[int] = None) -> Optional[Dict]:
+        return self._visible(self._by_id.get(id), user_id)
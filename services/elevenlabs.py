@@ -1,5 +1,13 @@
-from aiohttp import ClientSession, FormData
-from typing import List, Dict
+import asyncio
+import mimetypes
+import os
+from contextlib import asynccontextmanager
+
+from aiohttp import ClientSession, ClientError, ClientResponse, ClientTimeout, FormData, TCPConnector, TraceConfig
+from typing import List, Dict, Optional, AsyncIterator, Callable
+
+from services.resilience import CircuitBreaker, backoff_delay, parse_retry_after
+from services.metrics import ELEVENLABS_SECONDS, ELEVENLABS_RESPONSES
 
 LANGUAGE_MAPPING = {
     "en": "Английский",
@@ -61,12 +69,68 @@ LANGUAGE_MAPPING = {
     "ga": "Ирландский",
     "cy": "Валлийский",
     "eu": "Баскский",
-    "ca": "Каталанский"
+    "ca": "Каталанский",
+    "unknown": "Неизвестный",
+    "custom": "Пользовательский"
+}
+
+
+def language_name(code: str) -> str:
+    return LANGUAGE_MAPPING.get(code, code)
+
+
+def _language_code(voice: Dict, default: str) -> str:
+    code = voice.get("labels", {}).get("language", default)
+    return code if code in LANGUAGE_MAPPING else default
+
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class ElevenLabsError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status is None or self.status in RETRYABLE_STATUSES
+
+
+class ElevenLabsRateLimitError(ElevenLabsError):
+    pass
+
+
+class ElevenLabsServerError(ElevenLabsError):
+    pass
+
+
+class ElevenLabsClientError(ElevenLabsError):
+    pass
+
+
+class ElevenLabsUnavailableError(ElevenLabsError):
+    pass
+
+
+TTS_MODEL_ID = "eleven_multilingual_v2"
+TTS_VOICE_SETTINGS = {
+    "similarity_boost": 0.6,
+    "stability": 0.4,
+    "style": 0.7,
+    "use_speaker_boost": True,
+    "speed": 1
 }
 
 
 class ElevenLabsAPI:
-    def __init__(self, api_key: str, api_url: str):
+    def __init__(self, api_key: str, api_url: str,
+                 connection_limit: int = 20,
+                 keepalive_timeout: float = 60,
+                 dns_cache_ttl: int = 300,
+                 max_retries: int = 3,
+                 request_deadline: float = 120,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
         self.api_key = api_key
         self.api_url = api_url
         self.headers = {
@@ -74,39 +138,175 @@ class ElevenLabsAPI:
             "Content-Type": "application/json",
             # "Accept-Language": "ru"
         }
+        self.connection_limit = connection_limit
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.max_retries = max_retries
+        self.request_deadline = request_deadline
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.session: Optional[ClientSession] = None
+        self.stats = {
+            "new_connections": 0,
+            "reused_connections": 0,
+            "retries": 0,
+            "failures": 0,
+            "circuit_rejections": 0,
+            "voices_not_modified": 0
+        }
+        self._voices: List[Dict] = []
+        self._voices_etag: Optional[str] = None
+
+    async def start(self):
+        if self.session and not self.session.closed:
+            return
+
+        trace_config = TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_create)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuse)
+
+        connector = TCPConnector(
+            limit_per_host=self.connection_limit,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl
+        )
+        self.session = ClientSession(connector=connector, trace_configs=[trace_config])
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def _get_session(self) -> ClientSession:
+        if self.session is None or self.session.closed:
+            await self.start()
+        return self.session
+
+    async def _on_connection_create(self, session, context, params):
+        self.stats["new_connections"] += 1
+
+    async def _on_connection_reuse(self, session, context, params):
+        self.stats["reused_connections"] += 1
+
+    @staticmethod
+    async def _error_from_response(response: ClientResponse, error_message: str) -> ElevenLabsError:
+        error_text = await response.text()
+        message = f"{error_message}: {response.status}, {error_text}"
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+
+        if response.status == 429:
+            return ElevenLabsRateLimitError(message, response.status, retry_after)
+        if response.status >= 500:
+            return ElevenLabsServerError(message, response.status, retry_after)
+        return ElevenLabsClientError(message, response.status, retry_after)
+
+    @asynccontextmanager
+    async def _request(self, method: str, path: str, endpoint: str, error_message: str,
+                       headers: Dict,
+                       json: Optional[Dict] = None,
+                       form_factory: Optional[Callable[[], FormData]] = None,
+                       stream: bool = False) -> AsyncIterator[ClientResponse]:
+        # Unless stream is set, the body is read inside the deadline and retry loop, so callers get it from cache
+        if not self.circuit_breaker.allow():
+            self.stats["circuit_rejections"] += 1
+            raise ElevenLabsUnavailableError(f"{error_message}: ElevenLabs is temporarily unavailable")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.request_deadline
+        attempt = 0
+
+        while True:
+            attempt += 1
+            session = await self._get_session()
+            started = loop.time()
+            try:
+                async with asyncio.timeout(deadline - loop.time()):
+                    response = await session.request(
+                        method,
+                        f"{self.api_url}{path}",
+                        headers=headers,
+                        json=json,
+                        data=form_factory() if form_factory else None,
+                        # A streamed body is read after the yield, so a stalled read is bounded here instead
+                        timeout=ClientTimeout(total=None, sock_read=deadline - loop.time()) if stream else session.timeout
+                    )
+                    if response.status == 200 and not stream:
+                        try:
+                            await response.read()
+                        except BaseException:
+                            response.release()
+                            raise
+            except (ClientError, TimeoutError) as e:
+                ELEVENLABS_RESPONSES.inc(endpoint=endpoint, status="network_error")
+                error = ElevenLabsError(f"{error_message}: {e!r}")
+            else:
+                ELEVENLABS_SECONDS.observe(loop.time() - started, endpoint=endpoint)
+                ELEVENLABS_RESPONSES.inc(endpoint=endpoint, status=str(response.status))
+                if response.status in (200, 304):
+                    self.circuit_breaker.record_success()
+                    try:
+                        yield response
+                    finally:
+                        response.release()
+                    return
+
+                error = await self._error_from_response(response, error_message)
+                response.release()
+
+            if not error.retryable:
+                # The upstream answered, so this says nothing about its health
+                self.circuit_breaker.record_success()
+                raise error
+
+            self.stats["failures"] += 1
+            if isinstance(error, ElevenLabsRateLimitError):
+                # Throttling comes from a healthy upstream; opening the breaker would lock every user out
+                self.circuit_breaker.record_success()
+            else:
+                self.circuit_breaker.record_failure()
+
+            delay = error.retry_after if error.retry_after is not None else backoff_delay(attempt)
+            if attempt > self.max_retries or loop.time() + delay >= deadline:
+                raise error
+            if not self.circuit_breaker.allow():
+                self.stats["circuit_rejections"] += 1
+                raise error
+
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)
 
     async def get_voices(self) -> List[Dict]:
-        async with ClientSession() as session:
-            async with session.get(
-                    f"{self.api_url}/voices",
-                    headers=self.headers
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    voices = []
-                    for voice in data.get("voices", []):
-                        if voice.get("category") == "professional":
-                            voices.append({
-                                "voice_id": voice["voice_id"],
-                                "name": voice["name"],
-                                "language": LANGUAGE_MAPPING.get(
-                                    voice.get("labels", {}).get("language", "unknown"), "Неизвестный"
-                                ),
-                                "gender": voice.get("labels", {}).get("gender", "unknown"),
-                                "is_cloned": voice.get("category") == "cloned"
-                            })
-                        elif voice.get("category") == "cloned":
-                            voices.append({
-                                "voice_id": voice["voice_id"],
-                                "name": voice["name"],
-                                "language": LANGUAGE_MAPPING.get(
-                                    voice.get("labels", {}).get("language", "custom"), "Пользовательский"
-                                ),
-                                "gender": voice.get("labels", {}).get("gender", "custom"),
-                                "is_cloned": voice.get("category") == "cloned"})
-
-                    return voices
-                raise Exception(f"Failed to get voices: {response.status}")
+        headers = self.headers
+        if self._voices_etag:
+            headers = {**self.headers, "If-None-Match": self._voices_etag}
+
+        async with self._request("GET", "/voices", "voices", "Failed to get voices", headers) as response:
+            if response.status == 304:
+                self.stats["voices_not_modified"] += 1
+                return self._voices
+
+            data = await response.json()
+            voices = []
+            for voice in data.get("voices", []):
+                if voice.get("category") == "professional":
+                    voices.append({
+                        "voice_id": voice["voice_id"],
+                        "name": voice["name"],
+                        "language": _language_code(voice, "unknown"),
+                        "gender": voice.get("labels", {}).get("gender", "unknown"),
+                        "is_cloned": voice.get("category") == "cloned"
+                    })
+                elif voice.get("category") == "cloned":
+                    voices.append({
+                        "voice_id": voice["voice_id"],
+                        "name": voice["name"],
+                        "language": _language_code(voice, "custom"),
+                        "gender": voice.get("labels", {}).get("gender", "custom"),
+                        "is_cloned": voice.get("category") == "cloned"})
+
+            self._voices = voices
+            self._voices_etag = response.headers.get("ETag")
+            return voices
 
     async def text_to_speech(self, text: str, voice_id: str,
                              model_id: str = "eleven_multilingual_v2",
@@ -115,48 +315,95 @@ class ElevenLabsAPI:
                              style: float = 0.7,
                              use_speaker_boost: bool = True,
                              speed: float = 1) -> bytes:
-        async with ClientSession() as session:
-            async with session.post(
-                    f"{self.api_url}/text-to-speech/{voice_id}",
-                    headers=self.headers,
-                    json={"text": text, 'model_id': model_id, "voice_settings": {
-                        "stability": stability,
-                        "similarity_boost": similarity_boost,
-                        "style": style,
-                        "use_speaker_boost": use_speaker_boost,
-                        'speed': speed
-                    }}
-            ) as response:
-                if response.status == 200:
-                    return await response.read()
-                raise Exception(f"Failed to generate speech: {response.status}")
+        async with self._request(
+                "POST",
+                f"/text-to-speech/{voice_id}",
+                "text-to-speech",
+                "Failed to generate speech",
+                self.headers,
+                json={"text": text, 'model_id': model_id, "voice_settings": {
+                    "stability": stability,
+                    "similarity_boost": similarity_boost,
+                    "style": style,
+                    "use_speaker_boost": use_speaker_boost,
+                    'speed': speed
+                }}
+        ) as response:
+            return await response.read()
 
-    async def clone_voice(self, name: str, files: List[bytes]) -> Dict:
-        form_data = FormData()
-        form_data.add_field("name", name)
+    async def stream_text_to_speech(self, text: str, voice_id: str,
+                                    model_id: str = "eleven_multilingual_v2",
+                                    similarity_boost: float = 0.6,
+                                    stability: float = 0.4,
+                                    style: float = 0.7,
+                                    use_speaker_boost: bool = True,
+                                    speed: float = 1,
+                                    chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        # Retries only cover the request itself; once bytes are flowing a failure ends the stream
+        async with self._request(
+                "POST",
+                f"/text-to-speech/{voice_id}/stream",
+                "text-to-speech/stream",
+                "Failed to generate speech",
+                self.headers,
+                json={"text": text, 'model_id': model_id, "voice_settings": {
+                    "stability": stability,
+                    "similarity_boost": similarity_boost,
+                    "style": style,
+                    "use_speaker_boost": use_speaker_boost,
+                    'speed': speed
+                }},
+                stream=True
+        ) as response:
+            try:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    yield chunk
+            except (ClientError, TimeoutError) as e:
+                raise ElevenLabsError(f"Failed to generate speech: {e!r}") from e
 
-        for i, file_data in enumerate(files):
-            form_data.add_field(
-                f"files",
-                file_data,
-                filename=f"sample_{i}.mp3"
-            )
+    async def clone_voice(self, name: str, file_paths: List[str]) -> Dict:
+        opened_files = []
+
+        def close_files():
+            for file in opened_files:
+                file.close()
+            opened_files.clear()
+
+        def build_form() -> FormData:
+            # File objects are streamed by aiohttp, so samples are never loaded into memory whole
+            close_files()
+            form_data = FormData()
+            form_data.add_field("name", name)
 
-        async with ClientSession() as session:
-            async with session.post(
-                    f"{self.api_url}/voices/add",
-                    headers={"xi-api-key": self.api_key},
-                    data=form_data
+            for i, path in enumerate(file_paths):
+                file = open(path, "rb")
+                opened_files.append(file)
+                form_data.add_field(
+                    f"files",
+                    file,
+                    filename=f"sample_{i}{os.path.splitext(path)[1]}",
+                    content_type=mimetypes.guess_type(path)[0] or "application/octet-stream"
+                )
+            return form_data
+
+        try:
+            async with self._request(
+                    "POST",
+                    "/voices/add",
+                    "voices/add",
+                    "Failed to clone voice",
+                    {"xi-api-key": self.api_key},
+                    form_factory=build_form
             ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return {
-                        "voice_id": data["voice_id"],
-                        "name": name,
-                        "language": "custom",
-                        "is_cloned": True
-                    }
-                raise Exception(f"Failed to clone voice: {response.status}")
+                data = await response.json()
+                return {
+                    "voice_id": data["voice_id"],
+                    "name": name,
+                    "language": "custom",
+                    "is_cloned": True
+                }
+        finally:
+            close_files()
 
     async def speech_to_speech(self,
                                audio_data: bytes,
@@ -167,29 +414,28 @@ class ElevenLabsAPI:
                                style: float = 0.0,
                                use_speaker_boost: bool = True) -> bytes:
 
-        form_data = FormData()
-
-        form_data.add_field(
-            "audio",
-            audio_data,
-            filename="input_audio.mp3",
-            content_type="audio/mpeg"
-        )
+        def build_form() -> FormData:
+            form_data = FormData()
 
-        form_data.add_field("model_id", model_id)
-        form_data.add_field("voice_settings",
-                            f'{{"similarity_boost": {similarity_boost}, "stability": {stability}, "style": {style}, "use_speaker_boost": {str(use_speaker_boost).lower()}}}'
-                            )
+            form_data.add_field(
+                "audio",
+                audio_data,
+                filename="input_audio.mp3",
+                content_type="audio/mpeg"
+            )
 
-        async with ClientSession() as session:
-            async with session.post(
-                    f"{self.api_url}/speech-to-speech/{voice_id}",
-                    headers={"xi-api-key": self.api_key},
-                    data=form_data
-            ) as response:
-                if response.status == 200:
-                    return await response.read()
-                else:
-                    error_text = await response.text()
-                    raise Exception(f"Failed to convert speech: {response.status}, {error_text}")
+            form_data.add_field("model_id", model_id)
+            form_data.add_field("voice_settings",
+                                f'{{"similarity_boost": {similarity_boost}, "stability": {stability}, "style": {style}, "use_speaker_boost": {str(use_speaker_boost).lower()}}}'
+                                )
+            return form_data
 
+        async with self._request(
+                "POST",
+                f"/speech-to-speech/{voice_id}",
+                "speech-to-speech",
+                "Failed to convert speech",
+                {"xi-api-key": self.api_key},
+                form_factory=build_form
+        ) as response:
+            return await response.read()
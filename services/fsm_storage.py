@@ -0,0 +1,93 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, BaseEventIsolation, StorageKey, DefaultKeyBuilder
+from aiogram.fsm.storage.memory import MemoryStorage, SimpleEventIsolation
+
+
+class SQLiteStorage(BaseStorage):
+    def __init__(self, path: str, ttl: Optional[int] = None):
+        self.path = path
+        self.ttl = ttl
+        self.key_builder = DefaultKeyBuilder()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        # WAL lets several worker processes on one host share the file
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            "key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL DEFAULT '{}', updated_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+
+    def _is_expired(self, updated_at: float) -> bool:
+        return self.ttl is not None and time.time() - updated_at > self.ttl
+
+    def _read(self, key: str):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT state, data, updated_at FROM fsm WHERE key = ?", (key,)
+            ).fetchone()
+            if row and self._is_expired(row[2]):
+                self._connection.execute("DELETE FROM fsm WHERE key = ?", (key,))
+                self._connection.commit()
+                return None
+            return row
+
+    def _write(self, key: str, column: str, value: Optional[str]):
+        with self._lock:
+            self._connection.execute(
+                f"INSERT INTO fsm (key, {column}, updated_at) VALUES (?, ?, ?) "
+                f"ON CONFLICT(key) DO UPDATE SET {column} = excluded.{column}, updated_at = excluded.updated_at",
+                (key, value, time.time())
+            )
+            if self.ttl is not None:
+                self._connection.execute("DELETE FROM fsm WHERE updated_at < ?", (time.time() - self.ttl,))
+            self._connection.commit()
+
+    async def set_state(self, key: StorageKey, state: Optional[Any] = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await asyncio.to_thread(self._write, self.key_builder.build(key), "state", value)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await asyncio.to_thread(self._read, self.key_builder.build(key))
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await asyncio.to_thread(self._write, self.key_builder.build(key), "data", json.dumps(dict(data)))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await asyncio.to_thread(self._read, self.key_builder.build(key))
+        return json.loads(row[1]) if row else {}
+
+    async def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def create_fsm_storage(backend: str, url: Optional[str] = None, ttl: Optional[int] = None) -> BaseStorage:
+    if backend == "redis":
+        try:
+            from aiogram.fsm.storage.redis import RedisStorage
+        except ImportError as e:
+            raise RuntimeError("Install the 'redis' package to use FSM_STORAGE=redis") from e
+        return RedisStorage.from_url(url or "redis://localhost:6379/0", state_ttl=ttl, data_ttl=ttl)
+
+    if backend == "sqlite":
+        return SQLiteStorage(url or "fsm.sqlite3", ttl=ttl)
+
+    return MemoryStorage()
+
+
+def create_events_isolation(backend: str, url: Optional[str] = None) -> BaseEventIsolation:
+    # Serializes updates per user so e.g. media group samples don't race on FSM data
+    if backend == "redis":
+        from aiogram.fsm.storage.redis import RedisEventIsolation
+        return RedisEventIsolation.from_url(url or "redis://localhost:6379/0")
+
+    return SimpleEventIsolation()
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+
+from database.database import Database
+from services.resilience import backoff_delay
+
+JobHandler = Callable[[Bot, Dict], Awaitable]
+FailureHandler = Callable[[Bot, Dict, Exception], Awaitable]
+
+
+class JobQueue:
+    def __init__(self, db: Database, workers: int = 2, poll_interval: float = 2.0,
+                 lease: float = 60, max_attempts: int = 3):
+        self.db = db
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+
+        self._handlers: Dict[str, Tuple[JobHandler, Optional[FailureHandler]]] = {}
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+        self.stats = {
+            "enqueued": 0,
+            "completed": 0,
+            "retried": 0,
+            "failed": 0,
+            "running": 0
+        }
+
+    def register(self, kind: str, handler: JobHandler, on_failure: Optional[FailureHandler] = None):
+        self._handlers[kind] = (handler, on_failure)
+
+    async def enqueue(self, kind: str, user_id: int, chat_id: int, payload: Dict) -> int:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        job_id = await self.db.enqueue_job(kind, user_id, chat_id, payload)
+        self.stats["enqueued"] += 1
+        # Workers in other processes pick the job up on their next poll
+        self._wakeup.set()
+        return job_id
+
+    def start(self, bot: Bot):
+        self._tasks = [asyncio.create_task(self._worker(bot)) for _ in range(self.workers)]
+        logging.info(f"Started {self.workers} job workers")
+
+    async def close(self):
+        # Interrupted jobs stay 'running' and are reclaimed once their lease expires
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, bot: Bot):
+        while True:
+            try:
+                job = await self.db.claim_job(self.lease)
+            except Exception:
+                logging.exception("Failed to claim a job")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._execute(bot, job)
+            except Exception:
+                # Recording the outcome failed; the job is reclaimed once its lease expires
+                logging.exception(f"Failed to record the outcome of job {job['id']}")
+
+    async def _heartbeat(self, job_id: int):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await self.db.extend_job_lease(job_id, self.lease)
+            except Exception:
+                logging.exception(f"Failed to extend lease of job {job_id}")
+
+    async def _execute(self, bot: Bot, job: Dict):
+        handler, on_failure = self._handlers.get(job['kind'], (None, None))
+        if handler is None:
+            await self.db.fail_job(job['id'], f"Unknown job kind: {job['kind']}")
+            self.stats["failed"] += 1
+            return
+
+        self.stats["running"] += 1
+        heartbeat = asyncio.create_task(self._heartbeat(job['id']))
+        try:
+            await handler(bot, job)
+        except Exception as e:
+            logging.exception(f"Job {job['id']} ({job['kind']}) failed on attempt {job['attempts']}")
+            # Errors such as rejected samples won't succeed on another attempt
+            if getattr(e, "retryable", True) and job['attempts'] < self.max_attempts:
+                await self.db.retry_job(job['id'], backoff_delay(job['attempts'], base=5, cap=60), str(e))
+                self.stats["retried"] += 1
+            else:
+                await self.db.fail_job(job['id'], str(e))
+                self.stats["failed"] += 1
+                if on_failure:
+                    try:
+                        await on_failure(bot, job, e)
+                    except Exception:
+                        logging.exception(f"Failure handler of job {job['id']} raised")
+        else:
+            await self.db.complete_job(job['id'])
+            self.stats["completed"] += 1
+        finally:
+            heartbeat.cancel()
+            self.stats["running"] -= 1
@@ -0,0 +1,145 @@
+import contextvars
+import logging
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+trace_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("trace_id", default="-")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._values: Dict[Tuple, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+        index = bisect_left(self.buckets, value)
+        if index < len(counts):
+            counts[index] += 1
+        self._values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = labels + (("le", str(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors: List[Callable[[], Dict[str, float]]] = []
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        metric = Counter(name, documentation)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Dict[str, float]]):
+        # Collectors expose counters kept elsewhere (e.g. cache stats) as gauges at scrape time
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, value in collector().items():
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram("bot_stage_duration_seconds", "Duration of handler stages")
+STAGE_ERRORS = registry.counter("bot_stage_errors_total", "Handler stages that raised")
+ELEVENLABS_SECONDS = registry.histogram("elevenlabs_request_duration_seconds", "ElevenLabs request latency")
+ELEVENLABS_RESPONSES = registry.counter("elevenlabs_responses_total", "ElevenLabs responses by status")
+DB_QUERY_SECONDS = registry.histogram("db_query_duration_seconds", "Database query latency")
+AUDIO_BYTES = registry.counter("audio_bytes_total", "Audio bytes moved per direction")
+UPDATES = registry.counter("bot_updates_total", "Telegram updates received")
+
+
+class Span:
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.elapsed = 0.0
+
+
+@contextmanager
+def span(stage: str) -> Iterator[Span]:
+    current = Span(stage)
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield current
+    except BaseException:
+        status = "error"
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        current.elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(current.elapsed, stage=stage)
+        logging.getLogger("timing").info(f"{stage}: {current.elapsed * 1000:.0f} ms ({status})")
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+class TraceIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = trace_id_var.get()
+        return True
+
+
+def set_trace_id(trace_id: Optional[str] = None) -> contextvars.Token:
+    return trace_id_var.set(trace_id or new_trace_id())
@@ -0,0 +1,128 @@
+import asyncio
+from collections import OrderedDict, defaultdict, deque
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+PRIORITY_TTS = 0
+PRIORITY_LONG_TTS = 1
+PRIORITY_STS = 2
+PRIORITY_BACKGROUND = 3
+
+
+class RequestScheduler:
+    def __init__(self, max_in_flight: int = 4, max_per_user: int = 2):
+        self.max_in_flight = max_in_flight
+        self.max_per_user = max_per_user
+
+        self._in_flight = 0
+        self._user_in_flight: Dict[int, int] = defaultdict(int)
+        # priority -> user_id -> waiters; users rotate to the end after each grant (round robin)
+        self._queues: Dict[int, "OrderedDict[int, deque]"] = {}
+
+        self.stats = {
+            "started": 0,
+            "queued": 0,
+            "max_queue_length": 0
+        }
+
+    def queue_length(self) -> int:
+        return sum(len(waiters) for users in self._queues.values() for waiters in users.values())
+
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _can_start(self, user_id: int) -> bool:
+        return self._in_flight < self.max_in_flight and self._user_in_flight[user_id] < self.max_per_user
+
+    def _acquire(self, user_id: int):
+        self._in_flight += 1
+        self._user_in_flight[user_id] += 1
+        self.stats["started"] += 1
+
+    def _release(self, user_id: int):
+        self._in_flight -= 1
+        self._user_in_flight[user_id] -= 1
+        if not self._user_in_flight[user_id]:
+            del self._user_in_flight[user_id]
+        self._dispatch()
+
+    def _next_waiter(self):
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            for user_id in list(users):
+                if self._user_in_flight[user_id] >= self.max_per_user:
+                    continue
+
+                waiters = users.pop(user_id)
+                future = waiters.popleft()
+                if waiters:
+                    users[user_id] = waiters
+                if not users:
+                    del self._queues[priority]
+                return user_id, future
+        return None
+
+    def _dispatch(self):
+        while self._in_flight < self.max_in_flight:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+
+            user_id, future = waiter
+            if future.done():
+                continue
+            self._acquire(user_id)
+            future.set_result(None)
+
+    def _position(self, priority: int) -> int:
+        return sum(
+            len(waiters)
+            for queue_priority, users in self._queues.items()
+            if queue_priority <= priority
+            for waiters in users.values()
+        )
+
+    def _remove_waiter(self, priority: int, user_id: int, future: asyncio.Future):
+        users = self._queues.get(priority)
+        if not users or user_id not in users:
+            return
+
+        waiters = users[user_id]
+        try:
+            waiters.remove(future)
+        except ValueError:
+            return
+        if not waiters:
+            del users[user_id]
+        if not users:
+            del self._queues[priority]
+
+    async def run(self, user_id: int, priority: int,
+                  func: Callable[[], Awaitable[T]],
+                  on_queued: Optional[Callable[[int], Awaitable]] = None) -> T:
+        if self._can_start(user_id):
+            self._acquire(user_id)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._queues.setdefault(priority, OrderedDict()).setdefault(user_id, deque()).append(future)
+            self.stats["queued"] += 1
+            self.stats["max_queue_length"] = max(self.stats["max_queue_length"], self.queue_length())
+
+            try:
+                # Waiting behind the user's own requests (e.g. chunk fan-out) is not a busy service
+                if on_queued and self._in_flight >= self.max_in_flight:
+                    await on_queued(self._position(priority))
+                await future
+            except BaseException:
+                if future.done() and not future.cancelled():
+                    self._release(user_id)
+                else:
+                    future.cancel()
+                    self._remove_waiter(priority, user_id, future)
+                raise
+
+        try:
+            return await func()
+        finally:
+            self._release(user_id)
@@ -0,0 +1,34 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {
+            "calls": 0,
+            "coalesced": 0
+        }
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # Marks the exception as retrieved even if every waiter was cancelled
+            task.exception()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Runs func once per key at a time; returns (result, shared) where shared means another caller ran it."""
+        task = self._tasks.get(key)
+        shared = task is not None
+
+        if shared:
+            self.stats["coalesced"] += 1
+        else:
+            # A detached task keeps the call alive for followers if the first caller is cancelled
+            task = asyncio.ensure_future(func())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.stats["calls"] += 1
+
+        return await asyncio.shield(task), shared
@@ -0,0 +1,40 @@
+from typing import AsyncIterator, Optional
+
+from aiogram.types import InputFile
+
+
+class StreamInputFile(InputFile):
+    def __init__(self, stream: AsyncIterator[bytes], filename: str):
+        super().__init__(filename=filename)
+        self.stream = stream
+        self.completed = False
+        self._buffer = bytearray()
+        self._first_chunk: Optional[bytes] = None
+
+    async def prefetch(self):
+        # Pulls the first chunk so upstream errors surface before the Telegram upload starts
+        self._first_chunk = await anext(self.stream, b"")
+
+    async def read(self, bot) -> AsyncIterator[bytes]:
+        if self._first_chunk is not None:
+            chunk, self._first_chunk = self._first_chunk, None
+            if chunk:
+                self._buffer.extend(chunk)
+                yield chunk
+
+        async for chunk in self.stream:
+            self._buffer.extend(chunk)
+            yield chunk
+
+        self.completed = True
+
+    @property
+    def size(self) -> int:
+        return len(self._buffer)
+
+    async def aclose(self):
+        # Releases the upstream response if the upload stopped before the stream was drained
+        await self.stream.aclose()
+
+    def getvalue(self) -> bytes:
+        return bytes(self._buffer)
@@ -0,0 +1,57 @@
+import re
+from typing import List
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+def _split_long_sentence(sentence: str, max_chars: int) -> List[str]:
+    parts = []
+    current = ""
+
+    for word in sentence.split():
+        while len(word) > max_chars:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(word[:max_chars])
+            word = word[max_chars:]
+
+        if not word:
+            continue
+
+        candidate = f"{current} {word}" if current else word
+        if len(candidate) > max_chars:
+            parts.append(current)
+            current = word
+        else:
+            current = candidate
+
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_text(text: str, max_chars: int) -> List[str]:
+    chunks = []
+    current = ""
+
+    for paragraph in PARAGRAPH_BREAK.split(text.strip()):
+        separator = "\n\n"
+        for sentence in SENTENCE_END.split(paragraph.strip()):
+            if not sentence:
+                continue
+
+            pieces = [sentence] if len(sentence) <= max_chars else _split_long_sentence(sentence, max_chars)
+            for piece in pieces:
+                candidate = f"{current}{separator}{piece}" if current else piece
+                if len(candidate) <= max_chars:
+                    current = candidate
+                else:
+                    chunks.append(current)
+                    current = piece
+                separator = " "
+
+    if current:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,42 @@
+import asyncio
+import logging
+
+from aiogram import Bot
+
+from handlers.voice import db, elevenlabs_api, voice_catalog, audio_processor, job_queue
+from services.metrics import TraceIdFilter
+from config import BOT_TOKEN, JOB_WORKERS
+
+
+async def main():
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s'
+    )
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(TraceIdFilter())
+
+    if JOB_WORKERS < 1:
+        raise RuntimeError("JOB_WORKERS must be at least 1 for a worker process")
+
+    bot = Bot(token=BOT_TOKEN)
+
+    await db.create_pool()
+    await db.create_tables()
+    await voice_catalog.load()
+    await elevenlabs_api.start()
+
+    job_queue.start(bot)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await job_queue.close()
+        await bot.session.close()
+        await elevenlabs_api.close()
+        audio_processor.close()
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())